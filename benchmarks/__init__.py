@@ -0,0 +1 @@
+"""Offline benchmarks for the preview pipeline (run with `python -m benchmarks.<name>`)."""
@@ -0,0 +1,93 @@
+"""
+Local CDN stand-in for offline benchmarks
+Serves image fixtures over HTTP: `/attachments/<name>` returns the original
+bytes and `/proxy/<name>?width=&height=` a resized copy, like Discord's media
+proxy. Both add a configurable latency.
+"""
+
+import asyncio
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+
+from aiohttp import web
+from PIL import Image  # type: ignore[reportMissingImports]
+
+_CONTENT_TYPES = {
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+    "webp": "image/webp",
+}
+
+
+def content_type_for(name: str) -> str:
+    return _CONTENT_TYPES.get(
+        name.rsplit(".", 1)[-1].lower(), "application/octet-stream"
+    )
+
+
+class LocalCDN:
+    def __init__(self, fixtures: Dict[str, bytes], latency: float = 0.03):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.requests = 0
+        self.bytes_served = 0
+        self._resized: Dict[Tuple[str, int, int], bytes] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_get("/attachments/{name}", self._original)
+        app.router.add_get("/proxy/{name}", self._proxy)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        sockets = site._server.sockets  # type: ignore[union-attr]
+        self.base_url = f"http://{host}:{sockets[0].getsockname()[1]}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def dimensions(self, name: str) -> Tuple[int, int]:
+        return Image.open(BytesIO(self.fixtures[name])).size
+
+    async def _respond(self, name: str, data: bytes) -> web.Response:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        self.requests += 1
+        self.bytes_served += len(data)
+        return web.Response(body=data, content_type=content_type_for(name))
+
+    async def _original(self, request: web.Request) -> web.Response:
+        name = request.match_info["name"]
+        if name not in self.fixtures:
+            raise web.HTTPNotFound()
+        return await self._respond(name, self.fixtures[name])
+
+    async def _proxy(self, request: web.Request) -> web.Response:
+        name = request.match_info["name"]
+        if name not in self.fixtures:
+            raise web.HTTPNotFound()
+        try:
+            width = int(request.query["width"])
+            height = int(request.query["height"])
+        except (KeyError, ValueError):
+            return await self._respond(name, self.fixtures[name])
+        key = (name, width, height)
+        if key not in self._resized:
+            # resize outside the measured pipeline; the real proxy does this remotely
+            img = Image.open(BytesIO(self.fixtures[name]))
+            img.seek(0)
+            img = img.convert(
+                "RGBA" if "transparency" in img.info or img.mode == "RGBA" else "RGB"
+            )
+            img.thumbnail((width, height))
+            bio = BytesIO()
+            img.save(bio, format="PNG" if img.mode == "RGBA" else "JPEG", quality=85)
+            self._resized[key] = bio.getvalue()
+        return await self._respond(name, self._resized[key])
@@ -0,0 +1,289 @@
+"""
+Fake Discord model for offline benchmarks
+A stub bot/guild/channel/thread/message graph that quacks like the discord.py
+objects the preview pipeline touches. Every method that would hit the REST API
+sleeps for a configurable latency and is counted in RestStats.
+"""
+
+import asyncio
+import datetime
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import discord
+
+DISCORD_EPOCH_MS = 1420070400000
+
+
+def snowflake_time(snowflake: int) -> datetime.datetime:
+    """Creation time encoded in a Discord snowflake."""
+    return datetime.datetime.fromtimestamp(
+        ((snowflake >> 22) + DISCORD_EPOCH_MS) / 1000, datetime.timezone.utc
+    )
+
+
+class _NotFoundResponse:
+    status = 404
+    reason = "Not Found"
+
+
+class FakeNotFound(discord.NotFound):
+    """The discord.NotFound a missing message or channel raises."""
+
+    def __init__(self, route: str) -> None:
+        super().__init__(_NotFoundResponse(), f"Unknown {route}")
+
+
+class RestStats:
+    """Simulated REST layer: per-route call counts and latency."""
+
+    def __init__(
+        self, latency: float = 0.05, not_found_latency: Optional[float] = None
+    ):
+        self.latency = latency
+        self.not_found_latency = (
+            latency if not_found_latency is None else not_found_latency
+        )
+        self.calls: Counter = Counter()
+
+    @property
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+    def reset(self) -> None:
+        self.calls.clear()
+
+    async def call(self, route: str, found: bool = True) -> None:
+        self.calls[route] += 1
+        delay = self.latency if found else self.not_found_latency
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if not found:
+            raise FakeNotFound(route)
+
+
+class _Avatar:
+    def __init__(self, url: str) -> None:
+        self.url = url
+
+
+class FakeUser:
+    def __init__(self, user_id: int, name: str = "someone", bot: bool = False):
+        self.id = user_id
+        self.display_name = name
+        self.display_avatar = _Avatar(f"https://cdn.example/avatars/{user_id}.png")
+        self.bot = bot
+
+
+class FakeAttachment:
+    def __init__(
+        self,
+        attachment_id: int,
+        url: str,
+        proxy_url: str,
+        content_type: str,
+        size: int,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+    ):
+        self.id = attachment_id
+        self.url = url
+        self.proxy_url = proxy_url
+        self.content_type = content_type
+        self.size = size
+        self.width = width
+        self.height = height
+        self.filename = url.rsplit("/", 1)[-1]
+
+
+class FakeMessage:
+    def __init__(
+        self,
+        message_id: int,
+        guild: "FakeGuild",
+        author: FakeUser,
+        content: str = "",
+        attachments: Optional[List[FakeAttachment]] = None,
+    ):
+        self.id = message_id
+        self.guild = guild
+        self.author = author
+        self.content = content
+        self.attachments = attachments or []
+        self.reactions: List[Any] = []
+        self.created_at = snowflake_time(message_id)
+        self.edited_at = None
+
+    def to_payload(self, channel_id: int) -> Dict[str, Any]:
+        """The raw JSON Discord returns for this message."""
+        return {
+            "id": str(self.id),
+            "channel_id": str(channel_id),
+            "content": self.content,
+            "author": {
+                "id": str(self.author.id),
+                "username": self.author.display_name,
+                "global_name": None,
+                "avatar": None,
+                "discriminator": "0",
+            },
+            "timestamp": self.created_at.isoformat(),
+            "edited_timestamp": None,
+            "reactions": [],
+            "attachments": [
+                {
+                    "id": str(a.id),
+                    "filename": a.filename,
+                    "url": a.url,
+                    "proxy_url": a.proxy_url,
+                    "content_type": a.content_type,
+                    "size": a.size,
+                    "width": a.width,
+                    "height": a.height,
+                }
+                for a in self.attachments
+            ],
+        }
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int, guild: "FakeGuild", rest: RestStats, name: str):
+        self.id = channel_id
+        self.guild = guild
+        self.name = name
+        self._rest = rest
+        self.messages: Dict[int, FakeMessage] = {}
+        # archived threads under this channel, newest archive first
+        self.public_archive: List["FakeThread"] = []
+        self.private_archive: List["FakeThread"] = []
+
+    async def fetch_message(self, message_id: int) -> FakeMessage:
+        message = self.messages.get(message_id)
+        await self._rest.call("fetch_message", found=message is not None)
+        return message  # type: ignore[return-value]
+
+    async def archived_threads(
+        self, *, limit: Optional[int] = 100, private: bool = False
+    ) -> AsyncIterator["FakeThread"]:
+        """Pages of 100 threads, newest archive first, one REST call per page."""
+        threads = self.private_archive if private else self.public_archive
+        remaining = len(threads) if limit is None else min(limit, len(threads))
+        for page_start in range(0, remaining, 100):
+            await self._rest.call("archived_threads")
+            for thread in threads[page_start : min(page_start + 100, remaining)]:
+                yield thread
+        if remaining == 0:
+            await self._rest.call("archived_threads")
+
+
+class FakeThread(FakeChannel):
+    def __init__(
+        self,
+        thread_id: int,
+        parent: FakeChannel,
+        rest: RestStats,
+        name: str,
+        archived: bool = False,
+    ):
+        super().__init__(thread_id, parent.guild, rest, name)
+        self.parent_id = parent.id
+        self.archived = archived
+        self.archive_timestamp: Optional[datetime.datetime] = None
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int, rest: RestStats, name: str = "bench guild"):
+        self.id = guild_id
+        self.name = name
+        self.icon = None
+        self.filesize_limit = 25 * 1024 * 1024
+        self._rest = rest
+        self.channels: Dict[int, FakeChannel] = {}
+        self._threads: Dict[int, FakeThread] = {}
+
+    @property
+    def threads(self) -> List[FakeThread]:
+        """Active threads in the gateway cache."""
+        return list(self._threads.values())
+
+    def add_channel(self, channel: FakeChannel) -> None:
+        self.channels[channel.id] = channel
+
+    def add_thread(self, thread: FakeThread) -> None:
+        if not thread.archived:
+            self._threads[thread.id] = thread
+
+    def get_channel(self, channel_id: int) -> Optional[FakeChannel]:
+        return self.channels.get(channel_id)
+
+    def get_thread(self, thread_id: int) -> Optional[FakeThread]:
+        return self._threads.get(thread_id)
+
+    def get_channel_or_thread(self, channel_id: int) -> Optional[FakeChannel]:
+        return self.channels.get(channel_id) or self._threads.get(channel_id)
+
+    async def active_threads(self) -> List[FakeThread]:
+        await self._rest.call("active_threads")
+        return self.threads
+
+
+class FakeHTTP:
+    """Stub discord.http.HTTPClient: raw message payloads over fake REST."""
+
+    def __init__(self, bot: "FakeBot") -> None:
+        self._bot = bot
+
+    async def get_message(self, channel_id: int, message_id: int) -> Dict[str, Any]:
+        channel = self._bot._all_channels.get(channel_id)
+        message = channel.messages.get(message_id) if channel else None
+        await self._bot._rest.call("fetch_message", found=message is not None)
+        assert message is not None
+        return message.to_payload(channel_id)
+
+
+class FakeBot:
+    """Stub commands.Bot: guild lookup from cache, fetch_channel over fake REST."""
+
+    def __init__(self, rest: RestStats, user_id: int = 1):
+        self.user = FakeUser(user_id, "preview-bot", bot=True)
+        self._rest = rest
+        self._guilds: Dict[int, FakeGuild] = {}
+        self._all_channels: Dict[int, FakeChannel] = {}
+        self.http = FakeHTTP(self)
+
+    @property
+    def guilds(self) -> List[FakeGuild]:
+        return list(self._guilds.values())
+
+    def add_guild(self, guild: FakeGuild) -> None:
+        self._guilds[guild.id] = guild
+
+    def register_channel(self, channel: FakeChannel) -> None:
+        """Make a channel or (archived) thread reachable through fetch_channel."""
+        self._all_channels[channel.id] = channel
+
+    def get_guild(self, guild_id: int) -> Optional[FakeGuild]:
+        return self._guilds.get(guild_id)
+
+    async def fetch_channel(self, channel_id: int) -> FakeChannel:
+        channel = self._all_channels.get(channel_id)
+        await self._rest.call("fetch_channel", found=channel is not None)
+        return channel  # type: ignore[return-value]
+
+
+class FakeSourceMessage:
+    """The message containing the link; reply() is counted as a REST call."""
+
+    def __init__(
+        self, guild: FakeGuild, channel: FakeChannel, author: FakeUser, rest: RestStats
+    ):
+        self.id = 0
+        self.guild = guild
+        self.channel = channel
+        self.author = author
+        self._rest = rest
+        self.replies: List[Dict[str, Any]] = []
+
+    async def reply(self, **kwargs: Any) -> None:
+        await self._rest.call("send_message")
+        self.replies.append(kwargs)
@@ -0,0 +1,132 @@
+"""
+Grid pipeline benchmark
+Compares CPU time and output size of the original grid pipeline (full RGBA decode,
+LANCZOS thumbnail, lossless PNG) with utils.grid.render_grid.
+
+    python -m benchmarks.grid_pipeline [--fixtures DIR] [--rounds N]
+
+Without --fixtures a synthetic set is generated: phone-sized JPEG photos, a
+transparent PNG and a palette GIF.
+"""
+
+import argparse
+import random
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image  # type: ignore[reportMissingImports]
+
+from utils.grid import render_grid
+
+
+def legacy_render_grid(datas: Sequence[Optional[bytes]], tile: int = 320) -> bytes:
+    """The pipeline compose_grid_image used before draft decoding and WebP output."""
+    size = (tile * 2, tile * 2)
+    imgs: List[Image.Image] = []
+    for data in datas[:4]:
+        if data is None:
+            continue
+        img = Image.open(BytesIO(data)).convert("RGBA")
+        img.thumbnail((tile, tile), Image.LANCZOS)
+        imgs.append(img)
+
+    canvas = Image.new("RGBA", size, (54, 57, 63, 255))
+    positions = [(0, 0), (tile, 0), (0, tile), (tile, tile)]
+    for idx, img in enumerate(imgs):
+        x, y = positions[idx]
+        w, h = img.size
+        canvas.paste(img, (x + (tile - w) // 2, y + (tile - h) // 2), img)
+
+    bio = BytesIO()
+    canvas.save(bio, format="PNG")
+    return bio.getvalue()
+
+
+def _photo(width: int, height: int, seed: int) -> Image.Image:
+    """A noisy gradient, which compresses roughly like a camera photo."""
+    rnd = random.Random(seed)
+    base = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 40)
+    return Image.merge(
+        "RGB",
+        (
+            base,
+            Image.blend(base, noise, 0.5),
+            noise.point(lambda v: (v + rnd.randint(0, 255)) % 256),
+        ),
+    )
+
+
+def _encode(img: Image.Image, fmt: str, **params) -> bytes:
+    bio = BytesIO()
+    img.save(bio, format=fmt, **params)
+    return bio.getvalue()
+
+
+def synthetic_fixtures() -> Dict[str, bytes]:
+    fixtures = {
+        f"photo_{i}.jpg": _encode(_photo(4032, 3024, i), "JPEG", quality=90)
+        for i in range(3)
+    }
+    fixtures["portrait.jpg"] = _encode(_photo(1536, 2048, 9), "JPEG", quality=85)
+
+    sticker = Image.new("RGBA", (1024, 1024), (0, 0, 0, 0))
+    sticker.paste(_photo(640, 640, 7).convert("RGBA"), (192, 192))
+    fixtures["sticker.png"] = _encode(sticker, "PNG")
+    fixtures["anim.gif"] = _encode(_photo(800, 600, 3).convert("P"), "GIF")
+    return fixtures
+
+
+def load_fixtures(directory: Path) -> Dict[str, bytes]:
+    return {
+        p.name: p.read_bytes()
+        for p in sorted(directory.iterdir())
+        if p.suffix.lower() in (".jpg", ".jpeg", ".png", ".gif", ".webp")
+    }
+
+
+def _measure(
+    func: Callable[[Sequence[Optional[bytes]]], object],
+    grids: List[List[bytes]],
+    rounds: int,
+) -> Tuple[float, int]:
+    """Return (CPU ms per grid, output bytes of the last grid)."""
+    out = func(grids[0])  # warm-up
+    start = time.process_time()
+    for _ in range(rounds):
+        for grid in grids:
+            out = func(grid)
+    cpu_ms = (time.process_time() - start) * 1000 / (rounds * len(grids))
+    data = out[1] if isinstance(out, tuple) else out
+    return cpu_ms, len(data)  # type: ignore[arg-type]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--fixtures", type=Path, help="directory of images to use")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else synthetic_fixtures()
+    blobs = list(fixtures.values())
+    if not blobs:
+        raise SystemExit("no fixtures found")
+    # every 4-image window over the fixture set, wrapping around
+    grids = [[blobs[(i + j) % len(blobs)] for j in range(4)] for i in range(len(blobs))]
+
+    print(f"{len(fixtures)} fixtures, {len(grids)} grids x {args.rounds} rounds")
+    for name, data in fixtures.items():
+        print(f"  {name:<16} {len(data) / 1024:>8.0f} KiB")
+
+    old_ms, old_bytes = _measure(legacy_render_grid, grids, args.rounds)
+    new_ms, new_bytes = _measure(render_grid, grids, args.rounds)
+    print(f"{'pipeline':<10} {'CPU ms/grid':>12} {'output bytes':>13}")
+    print(f"{'legacy':<10} {old_ms:>12.1f} {old_bytes:>13}")
+    print(f"{'current':<10} {new_ms:>12.1f} {new_bytes:>13}")
+    print(f"speedup x{old_ms / new_ms:.1f}, size x{old_bytes / new_bytes:.1f} smaller")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+on_message throughput benchmark
+Replays a synthetic message stream through MessagePreview.on_message and reports
+messages/sec, next to a replica of the original filter (regex on every message,
+mention strings rebuilt per message). Previews themselves are stubbed out.
+
+    python -m benchmarks.on_message_throughput [--messages N] [--link-ratio R]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import Any, List
+
+import cogs.message_preview as message_preview
+from cogs.message_preview import MESSAGE_LINK_PATTERN, MessagePreview
+
+BOT_ID = 111111111111111111
+
+WORDS = (
+    "lol ok yeah nice gg brb anyone up for ranked tonight? "
+    "check the pinned message the build is broken again "
+    "https://example.com/some/article see you at 9 :wave:"
+).split()
+
+
+class _Stub:
+    def __init__(self, **kwargs: Any) -> None:
+        self.__dict__.update(kwargs)
+
+
+class StubBot:
+    """Just enough of commands.Bot for the listener."""
+
+    def __init__(self) -> None:
+        self.user = _Stub(id=BOT_ID)
+        self.guilds: List[Any] = []
+        self.commands_processed = 0
+
+    async def process_commands(self, message: Any) -> None:
+        self.commands_processed += 1
+
+
+def _link(rnd: random.Random) -> str:
+    ids = [rnd.randrange(10**17, 10**18) for _ in range(3)]
+    return "https://discord.com/channels/{}/{}/{}".format(*ids)
+
+
+def make_stream(count: int, link_ratio: float, mention_ratio: float, seed: int = 1):
+    """Chat messages with a small share of links and of bot-mentioned links."""
+    rnd = random.Random(seed)
+    author = _Stub(bot=False, id=42)
+    channel = _Stub(id=7)
+    guild = _Stub(id=9)
+    stream = []
+    for i in range(count):
+        text = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(3, 30)))
+        roll = rnd.random()
+        if roll < mention_ratio:
+            text = f"<@{BOT_ID}> {_link(rnd)}"
+        elif roll < mention_ratio + link_ratio:
+            text = f"{text} {_link(rnd)}"
+        stream.append(
+            _Stub(id=i, content=text, author=author, channel=channel, guild=guild)
+        )
+    return stream
+
+
+async def legacy_on_message(cog: MessagePreview, message: Any) -> None:
+    """The filter on_message used before the pre-filter (previews stubbed)."""
+    if message.author.bot:
+        return
+    if cog.bot.user is None:
+        await cog.bot.process_commands(message)
+        return
+    links = MESSAGE_LINK_PATTERN.findall(message.content)
+    if not links:
+        await cog.bot.process_commands(message)
+        return
+    mention1 = f"<@{cog.bot.user.id}> "
+    mention2 = f"<@!{cog.bot.user.id}> "
+    if not (
+        message.content.startswith(mention1) or message.content.startswith(mention2)
+    ):
+        await cog.bot.process_commands(message)
+        return
+    await cog.bot.process_commands(message)
+
+
+async def _noop_previews(*args: Any, **kwargs: Any) -> None:
+    return None
+
+
+async def _replay(listener, cog: MessagePreview, stream: List[Any]) -> float:
+    start = time.perf_counter()
+    for message in stream:
+        await listener(cog, message)
+    return len(stream) / (time.perf_counter() - start)
+
+
+async def run(count: int, link_ratio: float, mention_ratio: float) -> None:
+    stream = make_stream(count, link_ratio, mention_ratio)
+    cog = MessagePreview(StubBot())  # type: ignore[arg-type]
+    # keep previews and rate limiting out of the measurement
+    message_preview.preview_core_links = _noop_previews
+    message_preview.preview_limiter.allow = lambda *a: True  # type: ignore[assignment]
+    legacy = await _replay(legacy_on_message, cog, stream)
+    current = await _replay(MessagePreview.on_message, cog, stream)
+    print(
+        f"{count} messages ({link_ratio:.1%} links, {mention_ratio:.1%} mentioned links)"
+    )
+    print(f"legacy filter   {legacy:>12,.0f} msg/s")
+    print(f"current filter  {current:>12,.0f} msg/s  (x{current / legacy:.1f})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--link-ratio", type=float, default=0.005)
+    parser.add_argument("--mention-ratio", type=float, default=0.001)
+    args = parser.parse_args()
+    asyncio.run(run(args.messages, args.link_ratio, args.mention_ratio))
+
+
+if __name__ == "__main__":
+    main()
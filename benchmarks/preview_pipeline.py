@@ -0,0 +1,345 @@
+"""
+Preview pipeline benchmark
+Drives the real preview pipeline (fetch_target_message -> create_preview_embed ->
+compose_grid_image -> reply) against the fake Discord model and a local CDN,
+and reports latency percentiles, REST calls per preview and CPU per grid.
+
+    python -m benchmarks.preview_pipeline [--iterations N] [--rest-latency S] ...
+
+Scenarios:
+  direct          link names the channel that holds the message
+  thread          link names the parent channel; message is in an active thread
+  archived        link names the parent channel; message is in an archived thread
+  grid            direct hit on a message with 4 image attachments
+  mixed           direct hit on a message with 2 images and 2 videos (thumbnail tiles)
+  repeat          the same link previewed again (cache path)
+  forward         a new message carrying the same 4 attachments (tile cache by id)
+  reupload        a new message with the same 4 files uploaded again (tile cache by content)
+"""
+
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import discord
+
+import utils.grid as grid
+from utils.downloader import close_session
+from utils.image_pool import shutdown_pool
+from utils.load_shed import LoadLevel, load_shedder
+from utils.message_cache import message_cache
+from utils.preview_core import preview_message_links
+from utils.render_cache import render_cache
+from utils.thread_index import thread_index
+from utils.tile_cache import tile_cache
+
+from .cdn import LocalCDN, content_type_for
+from .fake_discord import (
+    FakeAttachment,
+    FakeBot,
+    FakeChannel,
+    FakeGuild,
+    FakeMessage,
+    FakeSourceMessage,
+    FakeThread,
+    FakeUser,
+    RestStats,
+)
+from .grid_pipeline import synthetic_fixtures
+
+GUILD_ID = 1000
+CHANNEL_ID = 2000
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+class GridCpuProbe:
+    """Wraps utils.grid.render_grid_tiles to record the CPU time each grid costs its worker thread."""
+
+    def __init__(self) -> None:
+        self.samples: List[float] = []
+        self._original: Optional[Callable[..., Any]] = None
+
+    def install(self) -> None:
+        self._original = grid.render_grid_tiles
+        original = self._original
+
+        def probed(*args: Any, **kwargs: Any) -> Any:
+            start = time.thread_time()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.samples.append(time.thread_time() - start)
+
+        grid.render_grid_tiles = probed  # type: ignore[assignment]
+
+    def uninstall(self) -> None:
+        if self._original is not None:
+            grid.render_grid_tiles = self._original  # type: ignore[assignment]
+
+
+class World:
+    """One guild with a text channel, active threads and archived threads."""
+
+    def __init__(self, rest: RestStats, cdn: LocalCDN, active: int, archived: int):
+        self.rest = rest
+        self.cdn = cdn
+        self.bot = FakeBot(rest)
+        self.guild = FakeGuild(GUILD_ID, rest)
+        self.bot.add_guild(self.guild)
+        self.author = FakeUser(42, "poster")
+        self.channel = FakeChannel(CHANNEL_ID, self.guild, rest, "general")
+        self.guild.add_channel(self.channel)
+        self.bot.register_channel(self.channel)
+        # real snowflakes, one second apart, starting 30 days ago, so ids carry
+        # the creation times the thread search prunes on
+        start = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+            days=30
+        )
+        self._ids = itertools.count(discord.utils.time_snowflake(start), 1000 << 22)
+
+        # Archived threads are the older ones: each got one message right after
+        # it was created and was archived an hour later. Links to those
+        # messages are the "archived" scenario.
+        self.archived_threads: List[FakeThread] = []
+        self.archived_messages: List[FakeMessage] = []
+        for _ in range(archived):
+            thread = self._thread(True)
+            message = self.post(thread)
+            thread.archive_timestamp = message.created_at + datetime.timedelta(hours=1)
+            self.archived_threads.append(thread)
+            self.archived_messages.append(message)
+        self.active_threads = [self._thread(False) for _ in range(active)]
+        # the API lists archived threads newest archive first
+        self.channel.public_archive = sorted(
+            self.archived_threads, key=lambda t: t.archive_timestamp, reverse=True
+        )
+
+    def _thread(self, archived: bool) -> FakeThread:
+        thread_id = next(self._ids)
+        thread = FakeThread(
+            thread_id, self.channel, self.rest, f"t{thread_id}", archived
+        )
+        self.guild.add_thread(thread)
+        self.bot.register_channel(thread)
+        return thread
+
+    def post(
+        self,
+        where: FakeChannel,
+        images: int = 0,
+        videos: int = 0,
+        attachments: Optional[List[FakeAttachment]] = None,
+    ) -> FakeMessage:
+        """Post a message with fresh attachments, or the given ones (a forward)."""
+        message_id = next(self._ids)
+        if attachments is not None:
+            message = FakeMessage(
+                message_id, self.guild, self.author, "forwarded", attachments
+            )
+            where.messages[message_id] = message
+            return message
+        attachments = []
+        names = list(self.cdn.fixtures)
+        for i in range(images + videos):
+            name = names[i % len(names)]
+            width, height = self.cdn.dimensions(name)
+            # the local proxy serves an image for any URL, standing in for the
+            # media proxy's video thumbnail frame
+            video = i >= images
+            attachments.append(
+                FakeAttachment(
+                    message_id * 10 + i,
+                    f"{self.cdn.base_url}/attachments/{name}",
+                    f"{self.cdn.base_url}/proxy/{name}",
+                    "video/mp4" if video else content_type_for(name),
+                    len(self.cdn.fixtures[name]),
+                    width,
+                    height,
+                )
+            )
+        message = FakeMessage(
+            message_id,
+            self.guild,
+            self.author,
+            f"benchmark message {message_id}",
+            attachments,
+        )
+        where.messages[message_id] = message
+        return message
+
+    def source(self) -> FakeSourceMessage:
+        return FakeSourceMessage(self.guild, self.channel, self.author, self.rest)
+
+
+def reset_caches(tiles: bool = True) -> None:
+    message_cache.clear()
+    render_cache.clear()
+    thread_index.clear()
+    if tiles:
+        tile_cache.clear()
+
+
+async def run_scenario(
+    name: str, world: World, iterations: int, probe: GridCpuProbe
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    rest_calls: List[int] = []
+    found = 0
+    repeat_target: Optional[FakeMessage] = None
+    original: Optional[FakeMessage] = None
+
+    for i in range(iterations + 1):  # the first iteration is an unmeasured warm-up
+        if name != "repeat" or i == 0:
+            # forwards and re-uploads keep the tiles cached by earlier iterations
+            reset_caches(tiles=i == 0 or name not in ("forward", "reupload"))
+        # startup behaviour: the cog indexes the guild's cached (active) threads
+        thread_index.add_guild(world.guild)
+
+        if name == "direct":
+            target, link_channel = world.post(world.channel), world.channel
+        elif name == "thread":
+            target = world.post(world.active_threads[i % len(world.active_threads)])
+            link_channel = world.channel
+        elif name == "archived":
+            target = world.archived_messages[i % len(world.archived_messages)]
+            link_channel = world.channel
+        elif name == "grid":
+            target, link_channel = world.post(world.channel, images=4), world.channel
+        elif name == "mixed":
+            target = world.post(world.channel, images=2, videos=2)
+            link_channel = world.channel
+        elif name == "forward":
+            if original is None:
+                original = world.post(world.channel, images=4)
+            target = world.post(world.channel, attachments=original.attachments)
+            link_channel = world.channel
+        elif name == "reupload":
+            target, link_channel = world.post(world.channel, images=4), world.channel
+        else:  # repeat
+            if repeat_target is None:
+                repeat_target = world.post(world.channel, images=4)
+            target, link_channel = repeat_target, world.channel
+
+        source = world.source()
+        world.rest.reset()
+        start = time.perf_counter()
+        await preview_message_links(
+            world.bot, source, [(GUILD_ID, link_channel.id, target.id)]  # type: ignore[arg-type]
+        )
+        elapsed = time.perf_counter() - start
+        if i == 0:
+            probe.samples.clear()
+            continue
+        found += bool(source.replies)
+        latencies.append(elapsed * 1000)
+        rest_calls.append(world.rest.total)
+
+    return {
+        "scenario": name,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "rest": statistics.mean(rest_calls),
+        "found": found / iterations,
+        "grid_cpu": statistics.mean(probe.samples) * 1000 if probe.samples else None,
+    }
+
+
+async def run(args: argparse.Namespace) -> None:
+    fixtures = synthetic_fixtures()
+    cdn = LocalCDN(fixtures, latency=args.cdn_latency)
+    await cdn.start()
+    rest = RestStats(args.rest_latency, args.not_found_latency)
+    world = World(rest, cdn, args.active_threads, args.archived_threads)
+    probe = GridCpuProbe()
+    probe.install()
+    # the lag monitor is not started here; pin the requested shedding tier
+    load_shedder.level = LoadLevel[args.load_level]
+    results = []
+
+    try:
+        print(
+            f"REST latency {args.rest_latency * 1000:.0f} ms "
+            f"(404: {rest.not_found_latency * 1000:.0f} ms), "
+            f"CDN latency {args.cdn_latency * 1000:.0f} ms, "
+            f"{args.active_threads} active / {args.archived_threads} archived threads, "
+            f"{args.iterations} iterations, load level {args.load_level}"
+        )
+        header = (
+            f"{'scenario':<10} {'found':>6} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'REST/preview':>13} {'grid CPU ms':>12}"
+        )
+        print(header)
+        print("-" * len(header))
+        for name in args.scenarios:
+            result = await run_scenario(name, world, args.iterations, probe)
+            results.append(result)
+            grid_cpu = (
+                "-" if result["grid_cpu"] is None else f"{result['grid_cpu']:.1f}"
+            )
+            print(
+                f"{name:<10} {result['found']:>6.0%} "
+                f"{result['p50']:>8.1f} {result['p95']:>8.1f} "
+                f"{result['p99']:>8.1f} {result['rest']:>13.1f} {grid_cpu:>12}"
+            )
+    finally:
+        probe.uninstall()
+        await close_session()
+        shutdown_pool()
+        await cdn.stop()
+
+    if args.json:
+        # machine-readable copy so CI can diff runs against a baseline
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+SCENARIOS = (
+    "direct",
+    "thread",
+    "archived",
+    "grid",
+    "mixed",
+    "repeat",
+    "forward",
+    "reupload",
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--rest-latency", type=float, default=0.05)
+    parser.add_argument("--not-found-latency", type=float, default=None)
+    parser.add_argument("--cdn-latency", type=float, default=0.03)
+    parser.add_argument("--active-threads", type=int, default=20)
+    parser.add_argument("--archived-threads", type=int, default=40)
+    parser.add_argument("--json", type=Path, help="also write results as JSON")
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS)
+    )
+    parser.add_argument(
+        "--load-level",
+        choices=[level.name for level in LoadLevel],
+        default=LoadLevel.NORMAL.name,
+        help="run with this load-shedding tier forced on",
+    )
+    # not-found warnings from the pipeline are expected in some scenarios
+    logging.basicConfig(level=logging.ERROR)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Shard Cluster Launcher
+Runs the bot as N worker processes, each owning a contiguous shard range.
+Crashed workers are restarted with exponential backoff, and their health and
+metrics are collected over a local Unix socket.
+
+    python cluster.py [--clusters N] [--shards S]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from utils.cluster_ipc import merge_metrics
+from utils.config import (
+    CLUSTER_REPORT_INTERVAL,
+    CLUSTERS,
+    METRICS_HOST,
+    METRICS_PORT,
+    RESTART_BACKOFF,
+    RESTART_BACKOFF_MAX,
+    RESTART_BACKOFF_RESET,
+    SHARD_COUNT,
+)
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+MAIN = str(Path(__file__).parent / "main.py")
+GATEWAY_URL = "https://discord.com/api/v10/gateway/bot"
+# Discord allows max_concurrency identifies per 5 seconds
+IDENTIFY_INTERVAL = 5.0
+
+
+async def fetch_gateway(token: str) -> Tuple[int, int]:
+    """Return Discord's recommended shard count and identify concurrency."""
+    headers = {"Authorization": f"Bot {token}"}
+    async with aiohttp.ClientSession() as session:
+        async with session.get(GATEWAY_URL, headers=headers) as resp:
+            resp.raise_for_status()
+            data = await resp.json()
+    limit = data.get("session_start_limit") or {}
+    return int(data["shards"]), int(limit.get("max_concurrency", 1))
+
+
+def split_shards(shard_count: int, clusters: int) -> List[List[int]]:
+    """Split shard ids 0..shard_count-1 into contiguous, near-equal ranges."""
+    clusters = max(1, min(clusters, shard_count))
+    size, extra = divmod(shard_count, clusters)
+    ranges, start = [], 0
+    for i in range(clusters):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+class Worker:
+    """One supervised `main.py` process running a fixed shard range."""
+
+    def __init__(self, cluster_id: int, shard_ids: List[int], shard_count: int):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.backoff = RESTART_BACKOFF
+        self.restarts = 0
+        self.report: Dict[str, Any] = {}
+        self.reported_at = 0.0
+
+    def env(self, ipc_path: str) -> Dict[str, str]:
+        env = dict(os.environ)
+        env.update(
+            PREVIEW_SHARDING="off",
+            PREVIEW_SHARD_IDS=f"{self.shard_ids[0]}-{self.shard_ids[-1]}",
+            PREVIEW_SHARD_COUNT=str(self.shard_count),
+            PREVIEW_CLUSTER_ID=str(self.cluster_id),
+            PREVIEW_CLUSTER_IPC=ipc_path,
+            PREVIEW_CLUSTER_PARENT=str(os.getpid()),
+            # the launcher serves the aggregated endpoint
+            PREVIEW_METRICS_PORT="0",
+        )
+        return env
+
+    async def supervise(
+        self, ipc_path: str, delay: float, stopping: asyncio.Event
+    ) -> None:
+        """Run the worker until stopping is set, restarting it when it exits."""
+        if await _wait(stopping, delay):
+            return
+        while not stopping.is_set():
+            started = time.monotonic()
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, MAIN, env=self.env(ipc_path)
+            )
+            logger.info(
+                f"Cluster {self.cluster_id} started (pid {self.process.pid}, "
+                f"shards {self.shard_ids[0]}-{self.shard_ids[-1]})"
+            )
+            code = await self.process.wait()
+            self.process = None
+            self.report = {}
+            if stopping.is_set():
+                break
+
+            ran = time.monotonic() - started
+            if ran >= RESTART_BACKOFF_RESET:
+                self.backoff = RESTART_BACKOFF
+            self.restarts += 1
+            logger.warning(
+                f"Cluster {self.cluster_id} exited with code {code} after {ran:.0f}s; "
+                f"restarting in {self.backoff:.0f}s"
+            )
+            if await _wait(stopping, self.backoff):
+                break
+            self.backoff = min(self.backoff * 2, RESTART_BACKOFF_MAX)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        process = self.process
+        if process is None or process.returncode is not None:
+            return
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Cluster {self.cluster_id} did not stop; killing it")
+            process.kill()
+            await process.wait()
+
+    def health(self) -> Dict[str, Any]:
+        age = time.monotonic() - self.reported_at if self.reported_at else None
+        fresh = age is not None and age < CLUSTER_REPORT_INTERVAL * 3
+        return {
+            "cluster": self.cluster_id,
+            "shards": self.shard_ids,
+            "pid": self.process.pid if self.process else None,
+            "running": self.process is not None,
+            "ready": bool(fresh and self.report.get("ready")),
+            "restarts": self.restarts,
+            "report_age": age,
+            "guilds": self.report.get("guilds"),
+            "latency": self.report.get("latency"),
+        }
+
+
+async def _wait(event: asyncio.Event, timeout: float) -> bool:
+    """Sleep up to timeout seconds; True if the event was set meanwhile."""
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+class Cluster:
+    def __init__(self, workers: List[Worker], ipc_path: str):
+        self.workers = {w.cluster_id: w for w in workers}
+        self.ipc_path = ipc_path
+
+    async def handle_report(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            async for line in reader:
+                try:
+                    report = json.loads(line)
+                    worker = self.workers[int(report["cluster"])]
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.debug(f"Ignoring malformed cluster report: {e}")
+                    continue
+                worker.report = report
+                worker.reported_at = time.monotonic()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    def health(self) -> Tuple[bool, Dict[str, Any]]:
+        clusters = [w.health() for w in self.workers.values()]
+        healthy = all(c["ready"] for c in clusters)
+        return healthy, {"healthy": healthy, "clusters": clusters}
+
+    async def start_http(self, host: str, port: int) -> web.AppRunner:
+        async def metrics(request: web.Request) -> web.Response:
+            text = merge_metrics(
+                {
+                    cid: w.report.get("metrics", "")
+                    for cid, w in self.workers.items()
+                    if w.report
+                }
+            )
+            return web.Response(text=text, content_type="text/plain", charset="utf-8")
+
+        async def health(request: web.Request) -> web.Response:
+            healthy, body = self.health()
+            return web.json_response(body, status=200 if healthy else 503)
+
+        app = web.Application()
+        app.router.add_get("/metrics", metrics)
+        app.router.add_get("/health", health)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"Cluster endpoint listening on http://{host}:{port}")
+        return runner
+
+
+async def run(args: argparse.Namespace) -> None:
+    shard_count, concurrency = args.shards, 1
+    if not shard_count:
+        token = os.getenv("DISCORD_TOKEN")
+        if not token:
+            logger.error("DISCORD_TOKEN not found in .env file")
+            return
+        shard_count, concurrency = await fetch_gateway(token)
+        logger.info(f"Discord recommends {shard_count} shard(s)")
+
+    ranges = split_shards(shard_count, args.clusters or os.cpu_count() or 1)
+    workers = [Worker(i, r, shard_count) for i, r in enumerate(ranges)]
+    ipc_path = os.path.join(
+        tempfile.gettempdir(), f"preview-cluster-{os.getpid()}.sock"
+    )
+    cluster = Cluster(workers, ipc_path)
+    logger.info(f"Starting {len(workers)} cluster(s) for {shard_count} shard(s)")
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+        loop.add_signal_handler(sig, stopping.set)
+
+    server = await asyncio.start_unix_server(cluster.handle_report, path=ipc_path)
+    runner = await cluster.start_http(METRICS_HOST, args.port) if args.port else None
+
+    # Stagger initial starts so workers do not exceed the identify rate limit
+    tasks, delay = [], 0.0
+    for worker in workers:
+        tasks.append(asyncio.create_task(worker.supervise(ipc_path, delay, stopping)))
+        delay += IDENTIFY_INTERVAL * len(worker.shard_ids) / max(1, concurrency)
+
+    try:
+        await stopping.wait()
+        logger.info("Stopping cluster")
+    finally:
+        stopping.set()
+        await asyncio.gather(*(w.stop() for w in workers))
+        await asyncio.gather(*tasks, return_exceptions=True)
+        server.close()
+        await server.wait_closed()
+        if runner is not None:
+            await runner.cleanup()
+        try:
+            os.unlink(ipc_path)
+        except OSError:
+            pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--clusters",
+        type=int,
+        default=CLUSTERS,
+        help="worker processes (default: PREVIEW_CLUSTERS or one per CPU core)",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=SHARD_COUNT,
+        help="total shards (default: PREVIEW_SHARD_COUNT or Discord's recommendation)",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=METRICS_PORT,
+        help="serve /health and /metrics here (default: PREVIEW_METRICS_PORT)",
+    )
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
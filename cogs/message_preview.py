@@ -4,21 +4,31 @@ Handles detection and preview of Discord message links
 """
 
 import logging
-import os
 import re
-from io import BytesIO
-from typing import Any, List, Optional
+from typing import Tuple
 
-import aiohttp
 import discord
 from discord import app_commands
 from discord.ext import commands
-from PIL import Image  # type: ignore[reportMissingImports]
 
-from utils.embed_builder import create_preview_embed
-from utils.fetcher import fetch_target_message
-from utils.helpers import compose_grid_image, make_message_buttons
-from utils.preview_core import preview_message_link as preview_core_link
+from utils import image_pool
+from utils.config import MAX_LINKS_PER_MESSAGE
+from utils.downloader import close_session, download_budget
+from utils.fetcher import fetch_coalescer
+from utils.helpers import OpenOriginalButton
+from utils.image_pool import shutdown_pool
+from utils.load_shed import Overloaded, load_shedder
+from utils.location_store import location_store
+from utils.message_cache import message_cache
+from utils.metrics import registry, stats_collector
+from utils.preview_core import build_preview
+from utils.preview_core import preview_message_links as preview_core_links
+from utils.preview_core import send_followup
+from utils.ratelimit import preview_limiter
+from utils.render_cache import render_cache
+from utils.scheduler import DeadlineExceeded, Priority, request_scope, rest_scheduler
+from utils.thread_index import thread_index
+from utils.tile_cache import tile_cache
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +47,112 @@ class MessagePreview(commands.Cog):
 
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        # "<@id> " / "<@!id> " mention prefixes, built once the bot user is known
+        self._mention_prefixes: Tuple[str, ...] = ()
+        self._set_mention_prefixes()
+
+    def _set_mention_prefixes(self) -> bool:
+        user = self.bot.user
+        if user is None:
+            return False
+        self._mention_prefixes = (f"<@{user.id}> ", f"<@!{user.id}> ")
+        return True
+
+    async def cog_load(self) -> None:
+        load_shedder.start()
+        try:
+            tile_cache.open()
+        except OSError as e:
+            logger.error(
+                f"Tile cache directory unavailable, keeping tiles in memory: {e}"
+            )
+        # Reload where messages and threads were found before the restart, so
+        # the first previews do not repeat every thread crawl over REST
+        if not location_store.path:
+            return
+        try:
+            await location_store.open()
+            await location_store.warm(thread_index)
+            thread_index.attach_store(location_store)
+        except Exception as e:
+            logger.error(f"Location store unavailable, continuing without it: {e}")
+
+    async def cog_unload(self) -> None:
+        self.bot.remove_dynamic_items(OpenOriginalButton)
+        load_shedder.stop()
+        # Release the pooled attachment-download session and image workers
+        await close_session()
+        shutdown_pool()
+        await tile_cache.close()
+        thread_index.attach_store(None)
+        await location_store.close()
+
+    @staticmethod
+    def _invalidate(message_id: int) -> None:
+        """Drop cached fetches and renders whose preview would now be stale."""
+        message_cache.invalidate(message_id)
+        render_cache.invalidate(message_id)
+
+    # Keep the thread index in step with the gateway so fetch_target_message
+    # can resolve thread ids without listing threads over REST.
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self._set_mention_prefixes()
+        indexed = sum(thread_index.add_guild(g) for g in self.bot.guilds)
+        logger.info(
+            f"Indexed {indexed} thread(s) across {len(self.bot.guilds)} guild(s)"
+        )
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild: discord.Guild):
+        thread_index.add_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        thread_index.add_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        thread_index.remove_guild(guild.id)
+
+    @commands.Cog.listener()
+    async def on_thread_create(self, thread: discord.Thread):
+        thread_index.add_thread(thread)
+
+    @commands.Cog.listener()
+    async def on_thread_join(self, thread: discord.Thread):
+        thread_index.add_thread(thread)
+
+    @commands.Cog.listener()
+    async def on_thread_update(self, before: discord.Thread, after: discord.Thread):
+        thread_index.add_thread(after)
+
+    @commands.Cog.listener()
+    async def on_raw_thread_delete(self, payload: discord.RawThreadDeleteEvent):
+        thread_index.remove_thread(payload.guild_id, payload.thread_id)
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        self._invalidate(payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        self._invalidate(payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(
+        self, payload: discord.RawBulkMessageDeleteEvent
+    ):
+        for message_id in payload.message_ids:
+            self._invalidate(message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        self._invalidate(payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        self._invalidate(payload.message_id)
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
@@ -46,42 +162,58 @@ class MessagePreview(commands.Cog):
         if message.author.bot:
             return
         # If bot user not ready yet, skip
-        if self.bot.user is None:
+        if not self._mention_prefixes and not self._set_mention_prefixes():
             await self.bot.process_commands(message)
             return
 
-        # Check for links, but only react to raw links when message mentions bot at start
-        links = MESSAGE_LINK_PATTERN.findall(message.content)
-
-        if not links:
+        # Cheap rejection before any regex: only react to raw links when the
+        # message starts with the bot mention (<@id> or <@!id> followed by space)
+        content = message.content
+        if (
+            not content.startswith(self._mention_prefixes)
+            or "/channels/" not in content
+        ):
             await self.bot.process_commands(message)
             return
 
-        # require mention at start for plain messages: formats <@id> or <@!id> followed by space
-        mention1 = f"<@{self.bot.user.id}> "
-        mention2 = f"<@!{self.bot.user.id}> "
-        if not (
-            message.content.startswith(mention1) or message.content.startswith(mention2)
-        ):
-            # do not auto-respond to plain links unless mentioned
+        links = MESSAGE_LINK_PATTERN.findall(content)
+        if not links:
             await self.bot.process_commands(message)
             return
 
-        # Process each message link found
-        for guild_id, channel_id, message_id in links:
-            await preview_core_link(
-                self.bot, message, int(guild_id), int(channel_id), int(message_id)
+        # Process each distinct link, capped per message and rate limited per
+        # user/channel/guild so a link-spamming message cannot drain the REST budget
+        unique_links = list(dict.fromkeys(links))
+        if len(unique_links) > MAX_LINKS_PER_MESSAGE:
+            logger.info(
+                f"Message {message.id} has {len(unique_links)} links; "
+                f"previewing the first {MAX_LINKS_PER_MESSAGE}"
             )
+        guild_key = message.guild.id if message.guild else None
+        allowed = []
+        for guild_id, channel_id, message_id in unique_links[:MAX_LINKS_PER_MESSAGE]:
+            if not preview_limiter.allow(
+                message.author.id, message.channel.id, guild_key
+            ):
+                logger.info(
+                    f"Rate limited previews for user {message.author.id} "
+                    f"in channel {message.channel.id}"
+                )
+                break
+            allowed.append((int(guild_id), int(channel_id), int(message_id)))
+
+        if allowed:
+            registry.inc("preview_requests_total", {"source": "mention"}, len(allowed))
+            with request_scope(Priority.MENTION):
+                await preview_core_links(self.bot, message, allowed)
 
         await self.bot.process_commands(message)
 
-    # Embed construction moved to `cogs/embed_builder.py` (function `create_preview_embed`).
-    # Use `from .embed_builder import create_preview_embed` at module level.
+    # Embed construction lives in `utils/embed_builder.py` and rendering in
+    # `utils/preview_core.py`; both entry points share `build_preview`.
 
     # context menu implementation removed per user request
 
-    # image composition moved to cogs/helpers.py (compose_grid_image)
-
     # Slash command to preview a message link
     @app_commands.command(name="preview", description="Preview a Discord message link")
     async def slash_preview(self, interaction: discord.Interaction, link: str) -> None:
@@ -91,129 +223,94 @@ class MessagePreview(commands.Cog):
             await interaction.followup.send("Invalid message link.", ephemeral=True)
             return
         guild_id, channel_id, message_id = match[0]
+        registry.inc("preview_requests_total", {"source": "interaction"})
+        if self.bot.get_guild(int(guild_id)) is None:
+            await interaction.followup.send("Guild not found.", ephemeral=True)
+            return
         try:
-            # fetch target message and reuse preview logic but send as followup
-            guild = self.bot.get_guild(int(guild_id))
-            if not guild:
-                await interaction.followup.send("Guild not found.", ephemeral=True)
-                return
-            channel = guild.get_channel(int(channel_id))
-            if channel is None:
-                try:
-                    channel = await self.bot.fetch_channel(int(channel_id))
-                except Exception:
+            # same render pipeline as on_message, delivered as a followup;
+            # interactions are served ahead of mention previews
+            with request_scope(Priority.INTERACTION):
+                preview = await build_preview(
+                    self.bot, int(guild_id), int(channel_id), int(message_id)
+                )
+                if preview is None:
                     await interaction.followup.send(
-                        "Channel not found.", ephemeral=True
+                        "Message not found.", ephemeral=True
                     )
                     return
 
-            target_message = None
-            fetch_msg = getattr(channel, "fetch_message", None)
-            if fetch_msg:
-                try:
-                    target_message = await fetch_msg(int(message_id))
-                except Exception:
-                    target_message = None
-
-            if target_message is None:
-                # try threads similar to preview_message_link
-                try:
-                    fetch_active = getattr(guild, "fetch_active_threads", None)
-                    if fetch_active:
-                        active = await fetch_active()
-                        threads = getattr(active, "threads", [])
-                    else:
-                        threads = []
-                except Exception:
-                    threads = []
-                for thread in threads:
-                    fetch_thread_msg = getattr(thread, "fetch_message", None)
-                    if not fetch_thread_msg:
-                        continue
-                    try:
-                        msg = await fetch_thread_msg(int(message_id))
-                        target_message = msg
-                        channel = thread
-                        break
-                    except Exception:
-                        continue
-
-            if target_message is None:
-                await interaction.followup.send("Message not found.", ephemeral=True)
-                return
-
-            # Build preview (reuse code path partially)
-            base_embed = create_preview_embed(target_message, channel)
-            # prepare view/buttons for original message
-            view = None
-            try:
-                original_url = (
-                    f"https://discord.com/channels/{guild_id}/{channel_id}/{message_id}"
-                )
-                view = make_message_buttons(original_url)
-            except Exception:
-                view = None
-            image_attachments = [
-                a
-                for a in target_message.attachments
-                if (a.content_type or "").startswith("image/")
-            ]
-            embeds: List[discord.Embed] = []
-            files = None
-
-            # Collect video attachments separately
-            video_attachments = [
-                a
-                for a in target_message.attachments
-                if (a.content_type or "").startswith("video/")
-            ]
-
-            # If there are images, set the first image on the base embed and add up to 3 more as embeds
-            if image_attachments:
-                base_embed.set_image(url=image_attachments[0].url)
-                for att in image_attachments[1:4]:
-                    img_embed = discord.Embed(color=0x5865F2)
-                    img_embed.set_image(url=att.url)
-                    embeds.append(img_embed)
-
-            # Videos: add links
-            if video_attachments:
-                video_links = "\n".join(
-                    f"[Video]({v.url})" for v in video_attachments[:4]
-                )
-                base_embed.add_field(name="Videos", value=video_links, inline=False)
-
-            # If multiple images, try composing into a grid and attach as a single file
-            if len(image_attachments) > 1:
                 try:
-                    tiles = image_attachments[:4]
-                    composed = await compose_grid_image(tiles)
-                    files = [composed]
-                    base_embed.set_image(url="attachment://grid.png")
-                    embeds = []
+                    await send_followup(interaction, [preview])
+                except DeadlineExceeded:
+                    raise
                 except Exception as e:
-                    logger.debug(f"Failed to compose grid image: {e}")
-
-            try:
-                send_kwargs = {}
-                send_kwargs["embeds"] = (
-                    [base_embed] + embeds if embeds else [base_embed]
-                )
-                if view:
-                    send_kwargs["view"] = view
-                if files:
-                    await interaction.followup.send(files=files, **send_kwargs)
-                else:
-                    await interaction.followup.send(**send_kwargs)
-            except Exception as e:
-                logger.debug(f"Failed to send followup preview: {e}")
+                    logger.debug(f"Failed to send followup preview: {e}")
 
+        except Overloaded:
+            await interaction.followup.send(
+                "The bot is busy right now; please try again shortly.",
+                ephemeral=True,
+            )
+        except DeadlineExceeded:
+            logger.warning(
+                f"/preview of message {message_id} dropped past its deadline"
+            )
+            await interaction.followup.send(
+                "Timed out while building the preview; please try again.",
+                ephemeral=True,
+            )
         except Exception as e:
             await interaction.followup.send(f"Error: {e}", ephemeral=True)
 
 
+def register_metrics() -> None:
+    """Expose the shared caches, limiter and pools as scrape-time gauges."""
+    registry.register_collector(
+        "message_cache", stats_collector("preview_message_cache", message_cache.stats)
+    )
+    registry.register_collector(
+        "render_cache", stats_collector("preview_render_cache", render_cache.stats)
+    )
+    registry.register_collector(
+        "coalescer", stats_collector("preview_fetch_coalescer", fetch_coalescer.stats)
+    )
+    registry.register_collector(
+        "limiter", stats_collector("preview_rate_limiter", preview_limiter.stats)
+    )
+    registry.register_collector(
+        "image_pool", stats_collector("preview_image_pool", image_pool.stats)
+    )
+    registry.register_collector(
+        "download_budget",
+        stats_collector("preview_download_budget", download_budget.stats),
+    )
+    registry.register_collector(
+        "location_store",
+        stats_collector("preview_location_store", location_store.stats),
+    )
+    registry.register_collector(
+        "tile_cache", stats_collector("preview_tile_cache", tile_cache.stats)
+    )
+    registry.register_collector(
+        "rest_scheduler",
+        stats_collector("preview_rest_scheduler", rest_scheduler.stats),
+    )
+    registry.register_collector(
+        "load_shedder", stats_collector("preview_load", load_shedder.stats)
+    )
+    registry.register_collector(
+        "thread_index",
+        lambda: [("preview_thread_index_threads", {}, thread_index.thread_count())],
+    )
+
+
 async def setup(bot: commands.Bot) -> None:
     """Setup function to load the cog"""
+    register_metrics()
+    # one handler for every "Open original message" button, including buttons
+    # on previews sent before a restart
+    bot.add_dynamic_items(OpenOriginalButton)
     mp = MessagePreview(bot)
     await bot.add_cog(mp)
     # Register slash command on the bot tree (global registration)
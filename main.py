@@ -3,20 +3,60 @@ Discord Bot Main File
 Handles bot initialization and loading of cogs
 """
 
+# Imported first so the startup report includes the imports below
+from utils.boot_clock import STARTED
+
+# isort: split
+import asyncio
 import logging
 import os
-from pathlib import Path
+import time
+from typing import Dict, Optional
 
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 
+from utils.cluster_ipc import report_forever
+from utils.command_sync import sync_if_changed
+from utils.config import (
+    CLUSTER_ID,
+    CLUSTER_IPC,
+    CLUSTER_PARENT,
+    CLUSTER_REPORT_INTERVAL,
+    GATEWAY_INTENTS,
+    MAX_MESSAGES,
+    METRICS_HOST,
+    METRICS_PORT,
+    SHARD_COUNT,
+    SHARD_IDS,
+    SHARDING,
+)
+from utils.metrics import registry, start_metrics_server
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
+# Extensions loaded at startup, in order. Listing them avoids scanning the
+# cogs directory; add new cogs here.
+COGS = ("cogs.message_preview",)
+
+# Startup phases in seconds since STARTED: imports, cogs, ready
+startup_times: Dict[str, float] = {"imports": time.perf_counter() - STARTED}
+registry.register_collector(
+    "startup",
+    lambda: [
+        ("preview_startup_seconds", {"phase": phase}, seconds)
+        for phase, seconds in startup_times.items()
+    ],
+)
+registry.describe(
+    "preview_startup_seconds", "Seconds from process start to each startup phase"
+)
+
 # Load environment variables
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
@@ -25,13 +65,73 @@ if not TOKEN:
     logger.error("DISCORD_TOKEN not found in .env file")
     exit(1)
 
-# Bot setup with intents
-intents = discord.Intents.default()
-intents.message_content = True
-intents.guilds = True
-intents.messages = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+def build_intents(spec: str = GATEWAY_INTENTS) -> discord.Intents:
+    """Build Intents from a comma-separated list of flag names.
+
+    Previews only need guilds, guild messages and message content, plus
+    reactions so cached previews are dropped when a reaction changes.
+    """
+    intents = discord.Intents.none()
+    for name in (n.strip() for n in spec.split(",")):
+        if not name:
+            continue
+        if name not in discord.Intents.VALID_FLAGS:
+            logger.warning(f"Ignoring unknown intent: {name}")
+            continue
+        setattr(intents, name, True)
+    return intents
+
+
+def create_bot() -> commands.Bot:
+    """Create the bot with a trimmed cache footprint, sharded if configured."""
+    options = dict(
+        command_prefix="!",
+        intents=build_intents(),
+        max_messages=MAX_MESSAGES or None,
+        member_cache_flags=discord.MemberCacheFlags.none(),
+        chunk_guilds_at_startup=False,
+    )
+    if SHARD_IDS:
+        if not SHARD_COUNT:
+            logger.error("PREVIEW_SHARD_IDS requires PREVIEW_SHARD_COUNT")
+            exit(1)
+        logger.info(f"Running shards {SHARD_IDS} of {SHARD_COUNT}")
+        return commands.AutoShardedBot(
+            shard_ids=SHARD_IDS, shard_count=SHARD_COUNT, **options
+        )
+    if SHARDING == "auto":
+        logger.info("Running with automatic sharding")
+        return commands.AutoShardedBot(shard_count=SHARD_COUNT or None, **options)
+    return commands.Bot(**options)
+
+
+bot = create_bot()
+
+# Cluster health reporter started by setup_hook; cancelled when the bot shuts down
+report_task: Optional["asyncio.Task[None]"] = None
+
+
+async def setup_hook() -> None:
+    """Runs once per process after login, before the gateway connects."""
+    global report_task
+    if CLUSTER_IPC:
+        # running under cluster.py: report health and metrics to the launcher
+        report_task = bot.loop.create_task(
+            report_forever(
+                bot, CLUSTER_IPC, CLUSTER_ID, CLUSTER_REPORT_INTERVAL, CLUSTER_PARENT
+            )
+        )
+    # commands are global, so only the first cluster syncs them
+    if CLUSTER_ID != 0:
+        return
+    try:
+        await sync_if_changed(bot)
+    except Exception as e:
+        logger.error(f"Failed to sync commands: {e}")
+
+
+bot.setup_hook = setup_hook
 
 
 @bot.event
@@ -43,41 +143,25 @@ async def on_ready():
         logger.info(f"Bot ID: {user.id}")
     else:
         logger.info("Bot ID: None (bot.user is not available yet)")
-    try:
-        synced = await bot.tree.sync()
-        logger.info(f"Synced {len(synced)} command(s)")
-    except Exception as e:
-        logger.error(f"Failed to sync commands: {e}")
+    # on_ready fires again after reconnects; only the first one is startup
+    if "ready" not in startup_times:
+        startup_times["ready"] = time.perf_counter() - STARTED
+        logger.info(
+            f"Ready {startup_times['ready']:.2f}s after start "
+            f"(imports {startup_times['imports']:.2f}s, "
+            f"cogs loaded at {startup_times.get('cogs', 0.0):.2f}s)"
+        )
 
 
 async def load_cogs():
-    """Load all cogs from the cogs directory"""
-    cogs_dir = Path(__file__).parent / "cogs"
-
-    if not cogs_dir.exists():
-        logger.warning(f"Cogs directory not found at {cogs_dir}")
-        return
-
-    for filename in cogs_dir.glob("*.py"):
-        if filename.name.startswith("_"):
-            continue
-
+    """Load the cogs listed in COGS"""
+    for name in COGS:
         try:
-            text = filename.read_text(encoding="utf-8")
-        except Exception:
-            logger.debug(f"Skipping unreadable file: {filename.name}")
-            continue
-
-        # Only attempt to load modules that define a Cog setup function
-        if ("def setup(" in text) or ("async def setup(" in text):
-            cog_name = filename.stem
-            try:
-                await bot.load_extension(f"cogs.{cog_name}")
-                logger.info(f"Loaded cog: {cog_name}")
-            except Exception as e:
-                logger.error(f"Failed to load cog {cog_name}: {e}")
-        else:
-            logger.debug(f"Skipping non-cog module: {filename.name}")
+            await bot.load_extension(name)
+            logger.info(f"Loaded cog: {name}")
+        except Exception as e:
+            logger.error(f"Failed to load cog {name}: {e}")
+    startup_times["cogs"] = time.perf_counter() - STARTED
 
 
 async def main() -> None:
@@ -88,6 +172,13 @@ async def main() -> None:
             logger.error("DISCORD_TOKEN is not a valid string")
             return
 
+        metrics_runner = None
+        if METRICS_PORT:
+            try:
+                metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+            except Exception as e:
+                logger.error(f"Failed to start metrics endpoint: {e}")
+
         try:
             await bot.start(TOKEN)
         except discord.errors.PrivilegedIntentsRequired:
@@ -100,9 +191,13 @@ async def main() -> None:
                 "3. Enable 'Message Content Intent' (and others if needed) -> Save Changes\n"
             )
             return
+        finally:
+            if report_task is not None:
+                report_task.cancel()
+                await asyncio.gather(report_task, return_exceptions=True)
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
 
 
 if __name__ == "__main__":
-    import asyncio
-
     asyncio.run(main())
@@ -1,7 +1,8 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
-# Run the bot in a restart loop and log output
+# Run the shard cluster launcher and log output. cluster.py supervises and
+# restarts the worker processes itself; the loop only covers the launcher.
 # Use project-relative paths so no absolute user paths are stored in the script
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 PROJECT_ROOT="$SCRIPT_DIR/.."
@@ -16,9 +17,9 @@ fi
 
 LOG="bot.log"
 
-echo "$(date '+%Y-%m-%d %H:%M:%S') - starting bot" >> "$LOG"
+echo "$(date '+%Y-%m-%d %H:%M:%S') - starting bot cluster" >> "$LOG"
 while true; do
-  "$PYEXEC" main.py >> "$LOG" 2>&1 || true
-  echo "$(date '+%Y-%m-%d %H:%M:%S') - bot exited, restarting in 5s" >> "$LOG"
+  "$PYEXEC" cluster.py >> "$LOG" 2>&1 || true
+  echo "$(date '+%Y-%m-%d %H:%M:%S') - cluster launcher exited, restarting in 5s" >> "$LOG"
   sleep 5
 done
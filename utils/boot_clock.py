@@ -0,0 +1,10 @@
+"""
+Boot clock
+main.py imports this module before anything else, so STARTED is taken before
+the bot's other imports and the startup report can include them.
+"""
+
+import time
+
+# time.perf_counter() as the bot started importing
+STARTED = time.perf_counter()
@@ -0,0 +1,111 @@
+"""
+Cluster IPC
+Workers started by cluster.py report health and a metrics snapshot to the
+launcher over a local Unix socket, one JSON object per line.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping
+
+from discord.ext import commands
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot(bot: commands.Bot, cluster_id: int, started: float) -> Dict[str, Any]:
+    """Health and metrics of this worker as one JSON-serializable report."""
+    latency = bot.latency
+    return {
+        "cluster": cluster_id,
+        "pid": os.getpid(),
+        "shards": list(getattr(bot, "shard_ids", None) or [0]),
+        "ready": bot.is_ready(),
+        "latency": latency if math.isfinite(latency) else None,
+        "guilds": len(bot.guilds),
+        "uptime": time.monotonic() - started,
+        "metrics": registry.render(),
+    }
+
+
+async def report_forever(
+    bot: commands.Bot,
+    path: str,
+    cluster_id: int,
+    interval: float,
+    parent_pid: int = 0,
+) -> None:
+    """Send a snapshot every interval seconds, reconnecting if the launcher restarts.
+
+    If the launcher process goes away the worker closes the bot instead of
+    running unsupervised.
+    """
+    started = time.monotonic()
+    while not bot.is_closed():
+        if parent_pid and os.getppid() != parent_pid:
+            logger.error("Cluster launcher exited; shutting down this worker")
+            # shielded: main cancels this task once the bot has stopped
+            await asyncio.shield(bot.close())
+            return
+        try:
+            _, writer = await asyncio.open_unix_connection(path)
+        except OSError as e:
+            logger.debug(f"Cluster IPC connect failed: {e}")
+            await asyncio.sleep(interval)
+            continue
+        try:
+            while not bot.is_closed():
+                if parent_pid and os.getppid() != parent_pid:
+                    break
+                report = snapshot(bot, cluster_id, started)
+                writer.write(json.dumps(report).encode("utf-8") + b"\n")
+                await writer.drain()
+                await asyncio.sleep(interval)
+        except (ConnectionError, OSError) as e:
+            logger.debug(f"Cluster IPC connection lost: {e}")
+        finally:
+            writer.close()
+
+
+def _label_sample(line: str, label: str) -> str:
+    brace = line.find("{")
+    space = line.find(" ")
+    if brace != -1 and (space == -1 or brace < space):
+        return f"{line[:brace + 1]}{label},{line[brace + 1:]}"
+    return f"{line[:space]}{{{label}}}{line[space:]}"
+
+
+def merge_metrics(reports: Mapping[int, str]) -> str:
+    """Merge per-worker Prometheus text into one exposition with a cluster label.
+
+    Samples are regrouped under a single HELP/TYPE header per metric family,
+    as the text format requires.
+    """
+    families: "OrderedDict[str, Dict[str, List[str]]]" = OrderedDict()
+    for cluster_id, text in sorted(reports.items()):
+        family = None
+        for line in text.splitlines():
+            if not line:
+                continue
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                name = line.split(" ", 3)[2]
+                family = families.setdefault(name, {"meta": [], "samples": []})
+                if line not in family["meta"]:
+                    family["meta"].append(line)
+                continue
+            if line.startswith("#") or family is None:
+                continue
+            family["samples"].append(_label_sample(line, f'cluster="{cluster_id}"'))
+
+    lines: List[str] = []
+    for family in families.values():
+        lines.extend(family["meta"])
+        lines.extend(family["samples"])
+    return "\n".join(lines) + "\n"
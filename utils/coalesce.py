@@ -0,0 +1,65 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from .scheduler import SharedRequest, rest_scheduler, shared_scope, time_left
+
+
+class Coalescer:
+    """Share one in-flight task between identical concurrent requests.
+
+    The first caller for a key starts `factory()`; callers arriving while it runs
+    await the same future. The shared task is shielded, so one waiter being
+    cancelled does not cancel the work for the others.
+
+    The task runs under a SharedRequest joined by every caller, so it is
+    scheduled at the most urgent priority and latest deadline among them. Each
+    caller's own deadline applies only to its wait for the result.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Hashable, Tuple["asyncio.Future[Any]", SharedRequest]] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._inflight.get(key)
+        if entry is not None:
+            self.coalesced += 1
+            future, shared = entry
+            shared.join()
+        else:
+            self.started += 1
+            shared = SharedRequest()
+            shared.join()
+            future = asyncio.ensure_future(self._shared(shared, factory))
+            self._inflight[key] = (future, shared)
+            future.add_done_callback(lambda f, k=key: self._done(k, f))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), time_left())
+        except asyncio.TimeoutError:
+            raise rest_scheduler.expire() from None
+
+    @staticmethod
+    async def _shared(
+        shared: SharedRequest, factory: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        with shared_scope(shared):
+            return await factory()
+
+    def _done(self, key: Hashable, future: "asyncio.Future[Any]") -> None:
+        entry = self._inflight.get(key)
+        if entry is not None and entry[0] is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            # mark the exception retrieved when nobody is left waiting
+            future.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "inflight": len(self._inflight),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
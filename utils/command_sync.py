@@ -0,0 +1,58 @@
+"""
+Application command sync
+Syncs the command tree only when its payload differs from the last successful
+sync, so restarts and reconnects do not spend the global command rate limit.
+"""
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Optional
+
+from discord import app_commands
+from discord.ext import commands
+
+from .config import COMMAND_HASH_FILE
+
+logger = logging.getLogger(__name__)
+
+
+def tree_hash(tree: app_commands.CommandTree) -> str:
+    """Hash the global command payloads exactly as they would be sent to Discord."""
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands()),
+        key=lambda d: (d.get("type", 1), d.get("name", "")),
+    )
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _read_stamp(path: Path) -> Optional[str]:
+    try:
+        return path.read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+
+
+async def sync_if_changed(
+    bot: commands.Bot, path: str = COMMAND_HASH_FILE, force: bool = False
+) -> bool:
+    """Sync bot.tree when its hash changed since the last sync; returns True if synced.
+
+    The stamp file records "<application id>:<hash>", so switching tokens
+    between bots still triggers a sync.
+    """
+    stamp_path = Path(path)
+    stamp = f"{bot.application_id}:{tree_hash(bot.tree)}"
+    if not force and _read_stamp(stamp_path) == stamp:
+        logger.info("Command tree unchanged; skipping sync")
+        return False
+
+    synced = await bot.tree.sync()
+    logger.info(f"Synced {len(synced)} command(s)")
+    try:
+        stamp_path.write_text(stamp + "\n", encoding="utf-8")
+    except OSError as e:
+        logger.warning(f"Could not write command hash file {stamp_path}: {e}")
+    return True
@@ -0,0 +1,145 @@
+"""Runtime tunables for the preview pipeline, read from the environment."""
+
+import os
+from typing import List
+
+from dotenv import load_dotenv
+
+# Load .env here so tunables see it no matter which module imports config first
+load_dotenv()
+
+
+def env_int(name: str, default: int) -> int:
+    """Return an integer environment variable, falling back to default on absence or bad input."""
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    """Return a float environment variable, falling back to default on absence or bad input."""
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_int_list(name: str) -> List[int]:
+    """Parse a list of integers such as "0,1,2" or "0-3" (ranges inclusive)."""
+    values: List[int] = []
+    for part in os.getenv(name, "").replace(" ", "").split(","):
+        if not part:
+            continue
+        try:
+            if "-" in part:
+                start, end = part.split("-", 1)
+                values.extend(range(int(start), int(end) + 1))
+            else:
+                values.append(int(part))
+        except ValueError:
+            return []
+    return values
+
+
+# Thread lookup (utils/fetcher.py, utils/thread_index.py)
+THREAD_SCAN_LIMIT = env_int("PREVIEW_THREAD_SCAN_LIMIT", 50)
+THREAD_PROBE_CONCURRENCY = env_int("PREVIEW_THREAD_PROBE_CONCURRENCY", 4)
+THREAD_ARCHIVE_PAGES = env_int("PREVIEW_THREAD_ARCHIVE_PAGES", 50)
+THREAD_MISS_TTL = env_float("PREVIEW_THREAD_MISS_TTL", 300.0)
+THREAD_MISS_MAX = env_int("PREVIEW_THREAD_MISS_MAX", 10000)
+THREAD_LOCATION_MAX = env_int("PREVIEW_THREAD_LOCATION_MAX", 50000)
+THREAD_OBJECT_MAX = env_int("PREVIEW_THREAD_OBJECT_MAX", 2048)
+
+# On-disk copy of the thread index (utils/location_store.py); empty disables it
+STORE_PATH = os.getenv("PREVIEW_STORE_PATH", "preview_index.sqlite3")
+STORE_MAX_LOCATIONS = env_int("PREVIEW_STORE_MAX_LOCATIONS", 500000)
+
+# Fetched-message cache (utils/message_cache.py)
+MESSAGE_CACHE_SIZE = env_int("PREVIEW_MESSAGE_CACHE_SIZE", 1024)
+MESSAGE_CACHE_TTL = env_float("PREVIEW_MESSAGE_CACHE_TTL", 120.0)
+
+# Rendered-preview cache (utils/render_cache.py)
+RENDER_CACHE_BYTES = env_int("PREVIEW_RENDER_CACHE_BYTES", 32 * 1024 * 1024)
+
+# Attachment downloads (utils/downloader.py)
+DOWNLOAD_POOL_SIZE = env_int("PREVIEW_DOWNLOAD_POOL_SIZE", 16)
+DOWNLOAD_REQUEST_TIMEOUT = env_float("PREVIEW_DOWNLOAD_TIMEOUT", 4.0)
+DOWNLOAD_TOTAL_TIMEOUT = env_float("PREVIEW_DOWNLOAD_TOTAL_TIMEOUT", 6.0)
+DOWNLOAD_MAX_BYTES = env_int("PREVIEW_DOWNLOAD_MAX_BYTES", 10 * 1024 * 1024)
+# proxy-scaled tiles are small; anything bigger is not what we asked for
+TILE_MAX_BYTES = env_int("PREVIEW_TILE_MAX_BYTES", 2 * 1024 * 1024)
+# encoded bytes held by all downloads and grid jobs at once
+DOWNLOAD_BUDGET_BYTES = env_int("PREVIEW_DOWNLOAD_BUDGET_BYTES", 64 * 1024 * 1024)
+
+# Resized grid tile cache (utils/tile_cache.py); an empty dir disables the disk spill
+TILE_CACHE_BYTES = env_int("PREVIEW_TILE_CACHE_BYTES", 16 * 1024 * 1024)
+TILE_CACHE_DIR = os.getenv("PREVIEW_TILE_CACHE_DIR", "")
+TILE_CACHE_DISK_BYTES = env_int("PREVIEW_TILE_CACHE_DISK_BYTES", 256 * 1024 * 1024)
+TILE_CACHE_IDS = env_int("PREVIEW_TILE_CACHE_IDS", 100000)
+
+# Image worker pool (utils/image_pool.py)
+IMAGE_EXECUTOR = os.getenv("PREVIEW_IMAGE_EXECUTOR", "thread").lower()
+IMAGE_WORKERS = env_int("PREVIEW_IMAGE_WORKERS", 2)
+IMAGE_QUEUE_LIMIT = env_int("PREVIEW_IMAGE_QUEUE_LIMIT", 8)
+
+# Grid output encoding (utils/grid.py): webp | jpeg | png
+GRID_TILE = env_int("PREVIEW_GRID_TILE", 320)
+GRID_FORMAT = os.getenv("PREVIEW_GRID_FORMAT", "webp").lower()
+GRID_QUALITY = env_int("PREVIEW_GRID_QUALITY", 80)
+
+# on_message limits (cogs/message_preview.py, utils/ratelimit.py)
+MAX_LINKS_PER_MESSAGE = env_int("PREVIEW_MAX_LINKS", 5)
+RATE_USER_PER_MINUTE = env_float("PREVIEW_RATE_USER_PER_MINUTE", 10.0)
+RATE_USER_BURST = env_float("PREVIEW_RATE_USER_BURST", 5.0)
+RATE_CHANNEL_PER_MINUTE = env_float("PREVIEW_RATE_CHANNEL_PER_MINUTE", 30.0)
+RATE_CHANNEL_BURST = env_float("PREVIEW_RATE_CHANNEL_BURST", 10.0)
+RATE_GUILD_PER_MINUTE = env_float("PREVIEW_RATE_GUILD_PER_MINUTE", 120.0)
+RATE_GUILD_BURST = env_float("PREVIEW_RATE_GUILD_BURST", 30.0)
+RATE_BUCKETS_MAX = env_int("PREVIEW_RATE_BUCKETS_MAX", 50000)
+LINK_CONCURRENCY = env_int("PREVIEW_LINK_CONCURRENCY", 3)
+
+# REST scheduler (utils/scheduler.py): concurrent Discord calls and per-class
+# deadlines in seconds (0 = none); interaction tokens expire after 15 minutes
+REST_CONCURRENCY = env_int("PREVIEW_REST_CONCURRENCY", 8)
+DEADLINE_INTERACTION = env_float("PREVIEW_DEADLINE_INTERACTION", 840.0)
+DEADLINE_MENTION = env_float("PREVIEW_DEADLINE_MENTION", 30.0)
+DEADLINE_BACKGROUND = env_float("PREVIEW_DEADLINE_BACKGROUND", 0.0)
+
+# Event-loop lag load shedding (utils/load_shed.py): smoothed lag in seconds
+# that enters each tier (0 disables a tier); tiers step back down after the
+# lag stays below LAG_RECOVER_RATIO x threshold for LAG_RECOVER_SECONDS
+LAG_INTERVAL = env_float("PREVIEW_LAG_INTERVAL", 0.5)
+LAG_NO_GRID = env_float("PREVIEW_LAG_NO_GRID", 0.1)
+LAG_NO_ARCHIVED = env_float("PREVIEW_LAG_NO_ARCHIVED", 0.25)
+LAG_CACHE_ONLY = env_float("PREVIEW_LAG_CACHE_ONLY", 1.0)
+LAG_RECOVER_RATIO = env_float("PREVIEW_LAG_RECOVER_RATIO", 0.5)
+LAG_RECOVER_SECONDS = env_float("PREVIEW_LAG_RECOVER_SECONDS", 15.0)
+
+# Metrics endpoint (utils/metrics.py); disabled unless a port is set
+METRICS_HOST = os.getenv("PREVIEW_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = env_int("PREVIEW_METRICS_PORT", 0)
+
+# Gateway connection and caches (main.py)
+# PREVIEW_SHARDING=auto runs an AutoShardedBot; PREVIEW_SHARD_IDS (with
+# PREVIEW_SHARD_COUNT) pins this process to a fixed shard range instead.
+SHARDING = os.getenv("PREVIEW_SHARDING", "off").lower()
+SHARD_COUNT = env_int("PREVIEW_SHARD_COUNT", 0)
+SHARD_IDS = env_int_list("PREVIEW_SHARD_IDS")
+GATEWAY_INTENTS = os.getenv(
+    "PREVIEW_INTENTS", "guilds,guild_messages,message_content,guild_reactions"
+)
+# discord.py message cache; 0 disables it (previews always fetch)
+MAX_MESSAGES = env_int("PREVIEW_MAX_MESSAGES", 0)
+COMMAND_HASH_FILE = os.getenv("PREVIEW_COMMAND_HASH_FILE", ".command_tree.hash")
+
+# Shard cluster (cluster.py, utils/cluster_ipc.py); set by the launcher per worker
+CLUSTER_ID = env_int("PREVIEW_CLUSTER_ID", 0)
+CLUSTER_IPC = os.getenv("PREVIEW_CLUSTER_IPC", "")
+CLUSTER_PARENT = env_int("PREVIEW_CLUSTER_PARENT", 0)
+CLUSTER_REPORT_INTERVAL = env_float("PREVIEW_CLUSTER_REPORT_INTERVAL", 10.0)
+# Launcher settings; 0 clusters means one per CPU core
+CLUSTERS = env_int("PREVIEW_CLUSTERS", 0)
+RESTART_BACKOFF = env_float("PREVIEW_RESTART_BACKOFF", 1.0)
+RESTART_BACKOFF_MAX = env_float("PREVIEW_RESTART_BACKOFF_MAX", 60.0)
+RESTART_BACKOFF_RESET = env_float("PREVIEW_RESTART_BACKOFF_RESET", 60.0)
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Sequence, Set
+
+import aiohttp
+
+from .config import (
+    DOWNLOAD_BUDGET_BYTES,
+    DOWNLOAD_MAX_BYTES,
+    DOWNLOAD_POOL_SIZE,
+    DOWNLOAD_REQUEST_TIMEOUT,
+    DOWNLOAD_TOTAL_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 64 * 1024
+# enough for every signature checked by sniff_image
+_SNIFF_BYTES = 12
+
+# One pooled session for the life of the cog (opened lazily, closed on unload)
+_session: Optional[aiohttp.ClientSession] = None
+
+
+class ResponseTooLarge(Exception):
+    """Raised when a download exceeds its byte limit."""
+
+
+class UnsupportedFormat(Exception):
+    """Raised when a sniffed download is not an image format the grid decodes."""
+
+
+def sniff_image(head: bytes) -> Optional[str]:
+    """Identify JPEG/PNG/GIF/WebP from the first bytes; None for anything else."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+class ByteBudget:
+    """Async cap on encoded bytes held in memory by concurrent downloads.
+
+    A download reserves its expected size before reading the body and the caller
+    releases the bytes once they have been decoded, so concurrent grid jobs
+    queue instead of together buffering more than `limit` bytes. A single
+    reservation larger than the limit is clamped so it can still run alone.
+    """
+
+    def __init__(self, limit: int = DOWNLOAD_BUDGET_BYTES) -> None:
+        self.limit = limit
+        self.used = 0
+        self.waits = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self, nbytes: int) -> int:
+        """Wait until nbytes fit; returns the amount actually reserved."""
+        nbytes = min(nbytes, self.limit)
+        async with self._cond:
+            if self.used + nbytes > self.limit:
+                self.waits += 1
+                await self._cond.wait_for(lambda: self.used + nbytes <= self.limit)
+            self.used += nbytes
+        return nbytes
+
+    def release(self, nbytes: int) -> None:
+        self.used = max(0, self.used - nbytes)
+        asyncio.ensure_future(self._notify())
+
+    async def _notify(self) -> None:
+        async with self._cond:
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        return {"used": self.used, "limit": self.limit, "waits": self.waits}
+
+
+# Shared by every grid job
+download_budget = ByteBudget()
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Return the shared connection-pooled session, creating it on first use."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=DOWNLOAD_POOL_SIZE, ttl_dns_cache=300)
+        _session = aiohttp.ClientSession(connector=connector)
+    return _session
+
+
+async def close_session() -> None:
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def download(
+    url: str,
+    max_bytes: int = DOWNLOAD_MAX_BYTES,
+    timeout: float = DOWNLOAD_REQUEST_TIMEOUT,
+    sniff: bool = False,
+    budget: Optional[ByteBudget] = None,
+) -> bytes:
+    """GET url through the shared session, streaming and enforcing max_bytes.
+
+    With sniff, the first bytes must be a supported image signature or the
+    transfer is abandoned with UnsupportedFormat. With a budget, the expected
+    size is reserved before the body is read; on success len(result) bytes
+    stay reserved and the caller must release them.
+    """
+    session = get_session()
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with session.get(url, timeout=client_timeout) as resp:
+        resp.raise_for_status()
+        if resp.content_length is not None and resp.content_length > max_bytes:
+            raise ResponseTooLarge(f"{resp.content_length} bytes > {max_bytes}")
+
+        reserved = 0
+        if budget is not None:
+            reserved = await budget.acquire(resp.content_length or max_bytes)
+        try:
+            buf = bytearray()
+            sniffed = not sniff
+            async for chunk in resp.content.iter_chunked(_CHUNK_SIZE):
+                buf.extend(chunk)
+                if len(buf) > max_bytes:
+                    raise ResponseTooLarge(f"more than {max_bytes} bytes")
+                if not sniffed and len(buf) >= _SNIFF_BYTES:
+                    if sniff_image(bytes(buf[:_SNIFF_BYTES])) is None:
+                        raise UnsupportedFormat(f"unrecognised header {buf[:4].hex()}")
+                    sniffed = True
+            if not sniffed and sniff_image(bytes(buf)) is None:
+                raise UnsupportedFormat("response too short to be an image")
+        except BaseException:
+            if budget is not None:
+                budget.release(reserved)
+            raise
+        if budget is not None and reserved > len(buf):
+            budget.release(reserved - len(buf))
+        return bytes(buf)
+
+
+async def download_all(
+    urls: Sequence[str],
+    max_bytes: int = DOWNLOAD_MAX_BYTES,
+    timeout: float = DOWNLOAD_REQUEST_TIMEOUT,
+    total_timeout: float = DOWNLOAD_TOTAL_TIMEOUT,
+    sniff: bool = False,
+    budget: Optional[ByteBudget] = None,
+) -> List[Optional[bytes]]:
+    """Download urls concurrently; slow or failed entries come back as None.
+
+    Each request has its own timeout and the batch as a whole is cut off after
+    total_timeout, so one slow CDN edge cannot stall the reply. With a budget,
+    the bytes of every returned entry stay reserved for the caller to release.
+    """
+    tasks = [
+        asyncio.ensure_future(download(u, max_bytes, timeout, sniff, budget))
+        for u in urls
+    ]
+    if not tasks:
+        return []
+    # tasks whose bytes are handed to the caller (and stay reserved)
+    kept: Set["asyncio.Future[bytes]"] = set()
+    try:
+        _, pending = await asyncio.wait(tasks, timeout=total_timeout)
+        results: List[Optional[bytes]] = []
+        for url, task in zip(urls, tasks):
+            if task in pending:
+                logger.debug(f"Download timed out: {url}")
+                results.append(None)
+            elif task.exception() is not None:
+                logger.debug(f"Download failed: {url}: {task.exception()}")
+                results.append(None)
+            else:
+                results.append(task.result())
+                kept.add(task)
+        return results
+    finally:
+        # also runs when the caller is cancelled mid-batch: stop every download
+        # and give back the budget held by any that finished but are not returned
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if budget is not None:
+            for task in tasks:
+                if (
+                    task not in kept
+                    and task.done()
+                    and not task.cancelled()
+                    and task.exception() is None
+                ):
+                    budget.release(len(task.result()))
@@ -2,8 +2,10 @@ from typing import Any, List
 
 import discord
 
+from .message_record import MessageRecord
 
-def create_preview_embed(message: discord.Message, channel: Any) -> discord.Embed:
+
+def create_preview_embed(message: MessageRecord, channel: Any) -> discord.Embed:
     """Create an embed preview of a message (moved from message_preview.py)."""
     embed = discord.Embed(
         description=message.content or "*[No content]*",
@@ -12,10 +14,8 @@ def create_preview_embed(message: discord.Message, channel: Any) -> discord.Embe
     )
 
     embed.set_author(
-        name=message.author.display_name or "Unknown",
-        icon_url=str(message.author.display_avatar.url)
-        if message.author.display_avatar
-        else None,
+        name=message.author_name or "Unknown",
+        icon_url=message.author_avatar,
     )
 
     guild_name = message.guild.name if message.guild else "Unknown"
@@ -28,7 +28,7 @@ def create_preview_embed(message: discord.Message, channel: Any) -> discord.Embe
 
     if message.reactions:
         reactions_text = " ".join(
-            f"{str(reaction.emoji)} {reaction.count}" for reaction in message.reactions
+            f"{emoji} {count}" for emoji, count in message.reactions
         )
         if reactions_text:
             embed.add_field(name="Reactions", value=reactions_text, inline=False)
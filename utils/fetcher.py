@@ -1,107 +1,373 @@
-from typing import Any, Optional, Tuple
+import asyncio
+import logging
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
 import discord
 from discord.ext import commands
 
+from .coalesce import Coalescer
+from .config import THREAD_ARCHIVE_PAGES, THREAD_PROBE_CONCURRENCY, THREAD_SCAN_LIMIT
+from .load_shed import Overloaded, load_shedder
+from .message_cache import MessageCache, message_cache
+from .message_record import MessageRecord
+from .metrics import count_rest, span
+from .scheduler import DeadlineExceeded, rest_scheduler
+from .thread_index import ThreadIndex, thread_index
+
+logger = logging.getLogger(__name__)
+
+# In-flight (guild, channel, message) lookups shared by on_message and /preview
+fetch_coalescer = Coalescer()
+
+
+class FetchFailed(Exception):
+    """A fetch failed for a transient reason (5xx, 429, a dropped connection).
+
+    Unlike NotFound it says nothing about whether the message is there.
+    """
+
+
+async def _resolve_channel(
+    bot: commands.Bot, guild: discord.Guild, channel_id: int, index: ThreadIndex
+) -> Optional[Any]:
+    """Return a channel or thread for channel_id, preferring caches over REST."""
+    get_any = getattr(guild, "get_channel_or_thread", None) or guild.get_channel
+    channel = get_any(channel_id)
+    if channel is None:
+        channel = index.get_thread(channel_id)
+    if channel is None:
+        count_rest("fetch_channel")
+        with span("channel_resolve"):
+            try:
+                async with rest_scheduler.slot():
+                    channel = await bot.fetch_channel(channel_id)
+            except DeadlineExceeded:
+                raise
+            except Exception:
+                return None
+        if isinstance(channel, discord.Thread):
+            index.add_thread(channel)
+    return channel
+
+
+async def _try_fetch(
+    bot: commands.Bot, channel: Any, message_id: int
+) -> Optional[MessageRecord]:
+    """Fetch message_id from channel as a compact MessageRecord, or None.
+
+    The raw payload is read from the HTTP client and decoded directly, which
+    skips building a full discord.Message; clients without an HTTP layer fall
+    back to channel.fetch_message. None means the message is not there (or
+    not visible); any other failure raises FetchFailed.
+    """
+    fetch_msg = getattr(channel, "fetch_message", None)
+    if not fetch_msg:
+        return None
+    count_rest("fetch_message")
+    http = getattr(bot, "http", None)
+    try:
+        async with rest_scheduler.slot():
+            if http is None:
+                return MessageRecord.from_message(await fetch_msg(message_id))
+            data = await http.get_message(channel.id, message_id)
+    except DeadlineExceeded:
+        raise
+    except (discord.NotFound, discord.Forbidden):
+        return None
+    except Exception as e:
+        raise FetchFailed(f"{type(e).__name__}: {e}") from e
+    return MessageRecord.from_payload(data, getattr(channel, "guild", None))
+
+
+def _rank(thread_ids: Iterable[int], message_id: int) -> List[int]:
+    """Drop threads created after the message and order the rest closest first.
+
+    Ids are snowflakes, so a thread whose id is greater than the message id was
+    created later and cannot contain it (equal ids are the thread's starter).
+    """
+    return sorted(
+        (t for t in thread_ids if t <= message_id), key=lambda t: message_id - t
+    )
+
+
+async def _probe_concurrently(
+    candidates: Sequence[Any],
+    probe: Callable[[Any], Awaitable[Optional[Tuple[MessageRecord, Any]]]],
+    fanout: int,
+) -> Optional[Tuple[MessageRecord, Any]]:
+    """Run probe over candidates, at most fanout at a time, in order.
+
+    Returns the first hit and cancels the probes still in flight.
+    """
+    remaining = iter(candidates)
+    pending: Set["asyncio.Future[Any]"] = set()
+
+    def refill() -> None:
+        while len(pending) < fanout:
+            candidate = next(remaining, None)
+            if candidate is None:
+                return
+            pending.add(asyncio.ensure_future(probe(candidate)))
+
+    refill()
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.discard(task)
+                if task.cancelled():
+                    continue
+                error = task.exception()
+                if isinstance(error, DeadlineExceeded):
+                    raise error
+                if error is None:
+                    hit = task.result()
+                    if hit is not None:
+                        return hit
+            refill()
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def _list_active(guild: discord.Guild, parent_id: int) -> List[Any]:
+    """Active threads under parent_id (one REST call for the whole guild)."""
+    fetch_active = getattr(guild, "active_threads", None)
+    if not fetch_active:
+        return []
+    count_rest("active_threads")
+    try:
+        with span("thread_list_active"):
+            async with rest_scheduler.slot():
+                active = await fetch_active()
+    except DeadlineExceeded:
+        raise
+    except Exception:
+        return []
+    return [t for t in active if t.parent_id == parent_id]
+
+
+async def _list_archived(
+    parent: Any, message_id: int, max_pages: int = THREAD_ARCHIVE_PAGES
+) -> List[Any]:
+    """Page through public then private archived threads under parent.
+
+    Pages come newest archive first. A thread archived before the message was
+    sent cannot hold it (posting would have unarchived it), so paging stops at
+    the first such thread. Only text channels have private threads; forum and
+    media channels list their (public) archive without a `private` argument.
+    """
+    archived_threads = getattr(parent, "archived_threads", None)
+    if not archived_threads:
+        return []
+    posted_at = discord.utils.snowflake_time(message_id)
+    limit = max_pages * 100 if max_pages > 0 else None
+    threads: List[Any] = []
+    tiers = (False, True) if isinstance(parent, discord.TextChannel) else (False,)
+    for private in tiers:
+        tier = "private" if private else "public"
+        listing = (
+            archived_threads(limit=limit, private=True)
+            if private
+            else archived_threads(limit=limit)
+        )
+        found = 0
+        try:
+            with span(f"thread_list_archived_{tier}"):
+                # one slot for the whole listing; pages are fetched back to back
+                async with rest_scheduler.slot():
+                    async for thread in listing:
+                        found += 1
+                        archived_at = getattr(thread, "archive_timestamp", None)
+                        if archived_at is not None and archived_at < posted_at:
+                            break
+                        threads.append(thread)
+        except discord.HTTPException:
+            # private archives need Manage Threads; Forbidden there is not fatal
+            continue
+        finally:
+            # the API pages archived threads 100 at a time
+            for _ in range(1 + found // 100):
+                count_rest("archived_threads")
+    return threads
+
 
 async def fetch_target_message(
-    bot: commands.Bot, guild_id: int, channel_id: int, message_id: int
-) -> Tuple[Optional[discord.Message], Optional[Any], Optional[discord.Guild]]:
+    bot: commands.Bot,
+    guild_id: int,
+    channel_id: int,
+    message_id: int,
+    index: Optional[ThreadIndex] = None,
+    scan_limit: int = THREAD_SCAN_LIMIT,
+    fanout: int = THREAD_PROBE_CONCURRENCY,
+) -> Tuple[Optional[MessageRecord], Optional[Any], Optional[discord.Guild]]:
     """Attempt to locate and fetch a message by guild/channel/message ids.
 
+    Known threads (and previously located messages) resolve through the thread
+    index with a single fetch. Otherwise threads under the linked channel are
+    searched tier by tier (indexed, active, archived): threads created after the
+    message are skipped, the rest are probed closest id first, `fanout` at a
+    time, up to `scan_limit` probes in total. Exhausted lookups are remembered
+    as misses; a lookup that skipped the archived tier under load shedding, or
+    hit a transient fetch error, is not. If the current request's deadline
+    passes, DeadlineExceeded is raised and nothing is recorded.
+
     Returns tuple (message, channel, guild) or (None, None, None) if not found.
     """
+    index = index or thread_index
     guild = bot.get_guild(guild_id)
     if not guild:
         return None, None, None
 
+    if index.is_miss(guild_id, channel_id, message_id):
+        return None, None, guild
+
+    # False once any part of the search was skipped or failed: no miss is recorded
+    exhaustive = True
+
+    async def fetch(channel: Any) -> Optional[MessageRecord]:
+        nonlocal exhaustive
+        try:
+            return await _try_fetch(bot, channel, message_id)
+        except FetchFailed as e:
+            logger.debug(f"Fetching message {message_id} failed: {e}")
+            exhaustive = False
+            return None
+
+    # A previous search already found which thread holds this message
+    located = index.location_of(guild_id, message_id)
+    if located is not None and located != channel_id:
+        with span("thread_search_located"):
+            thread = await _resolve_channel(bot, guild, located, index)
+            target_message = await fetch(thread) if thread else None
+        if target_message is not None:
+            return target_message, thread, guild
+        if exhaustive:
+            index.forget_location(guild_id, message_id)
+
     # Resolve channel
-    channel = guild.get_channel(channel_id)
+    channel = await _resolve_channel(bot, guild, channel_id, index)
     if channel is None:
-        try:
-            channel = await bot.fetch_channel(channel_id)
-        except Exception:
-            return None, None, guild
+        return None, None, guild
 
     # Try direct fetch
-    target_message: Optional[discord.Message] = None
-    fetch_msg = getattr(channel, "fetch_message", None)
-    if fetch_msg:
-        try:
-            target_message = await fetch_msg(message_id)
-        except Exception:
-            target_message = None
+    with span("direct_fetch"):
+        target_message = await fetch(channel)
+    if target_message is not None:
+        return target_message, channel, guild
 
-    # If not found, search threads (active -> public archived -> private archived)
-    if target_message is None:
-        try:
-            # active threads
-            fetch_active = getattr(guild, "fetch_active_threads", None)
-            if fetch_active:
-                active = await fetch_active()
-                threads = getattr(active, "threads", [])
-            else:
-                threads = []
-        except Exception:
-            threads = []
-
-        for thread in threads:
-            fetch_thread_msg = getattr(thread, "fetch_message", None)
-            if not fetch_thread_msg:
-                continue
-            try:
-                msg = await fetch_thread_msg(message_id)
-                target_message = msg
-                channel = thread
-                break
-            except Exception:
-                continue
+    # The link names a thread directly: nothing else to search
+    if isinstance(channel, discord.Thread) or index.parent_of(guild_id, channel_id):
+        if exhaustive:
+            index.record_miss(guild_id, channel_id, message_id)
+        return None, None, guild
 
-        if target_message is None:
-            # public archived
-            try:
-                fetch_pub = getattr(guild, "fetch_public_archived_threads", None)
-                if fetch_pub:
-                    archived = await fetch_pub(limit=100)
-                    athreads = getattr(archived, "threads", [])
-                else:
-                    athreads = []
-            except Exception:
-                athreads = []
+    tried: Set[int] = set()
+    budget = scan_limit
 
-            for thread in athreads:
-                fetch_thread_msg = getattr(thread, "fetch_message", None)
-                if not fetch_thread_msg:
-                    continue
-                try:
-                    msg = await fetch_thread_msg(message_id)
-                    target_message = msg
-                    channel = thread
-                    break
-                except Exception:
-                    continue
+    async def probe_id(thread_id: int) -> Optional[Tuple[MessageRecord, Any]]:
+        thread = await _resolve_channel(bot, guild, thread_id, index)
+        found = await fetch(thread) if thread else None
+        return (found, thread) if found is not None else None
 
-        if target_message is None:
-            # private archived
-            try:
-                fetch_priv = getattr(guild, "fetch_private_archived_threads", None)
-                if fetch_priv:
-                    archived_priv = await fetch_priv(limit=100)
-                    patr = getattr(archived_priv, "threads", [])
-                else:
-                    patr = []
-            except Exception:
-                patr = []
-            for thread in patr:
-                fetch_thread_msg = getattr(thread, "fetch_message", None)
-                if not fetch_thread_msg:
-                    continue
-                try:
-                    msg = await fetch_thread_msg(message_id)
-                    target_message = msg
-                    channel = thread
-                    break
-                except Exception:
-                    continue
+    async def probe_objects(
+        threads: List[Any], stage: str
+    ) -> Optional[Tuple[MessageRecord, Any]]:
+        nonlocal budget
+        by_id = {t.id: t for t in threads if t.id not in tried}
+        for thread in by_id.values():
+            index.add_thread(thread)
+        ranked = _rank(by_id, message_id)[: max(budget, 0)]
+        tried.update(ranked)
+        budget -= len(ranked)
+
+        async def probe(thread_id: int) -> Optional[Tuple[MessageRecord, Any]]:
+            thread = by_id[thread_id]
+            found = await fetch(thread)
+            return (found, thread) if found is not None else None
+
+        with span(stage):
+            return await _probe_concurrently(ranked, probe, fanout)
+
+    # Threads the index already knows under this channel
+    ranked = _rank(index.threads_under(guild_id, channel_id), message_id)[:budget]
+    tried.update(ranked)
+    budget -= len(ranked)
+    with span("thread_search_indexed"):
+        hit = await _probe_concurrently(ranked, probe_id, fanout)
+
+    # Then active threads, then every archived thread that could hold the message
+    if hit is None and budget > 0:
+        hit = await probe_objects(
+            await _list_active(guild, channel.id), "thread_search_active"
+        )
+    if hit is None and budget > 0 and load_shedder.skip_archived:
+        load_shedder.shed("archived")
+        exhaustive = False
+    elif hit is None and budget > 0:
+        hit = await probe_objects(
+            await _list_archived(channel, message_id), "thread_search_archived"
+        )
+
+    if hit is not None:
+        target_message, thread = hit
+        index.record_location(guild_id, message_id, thread.id)
+        return target_message, thread, guild
+
+    logger.debug(
+        f"Message {message_id} not found after probing {len(tried)} thread(s) under {channel_id}"
+    )
+    if exhaustive:
+        index.record_miss(guild_id, channel_id, message_id)
+    return None, None, guild
+
+
+async def get_target_message(
+    bot: commands.Bot,
+    guild_id: int,
+    channel_id: int,
+    message_id: int,
+    cache: Optional[MessageCache] = None,
+) -> Tuple[Optional[MessageRecord], Optional[Any], Optional[discord.Guild]]:
+    """`fetch_target_message` behind the shared message cache and request coalescer.
+
+    Only successful lookups are cached; misses are handled by the thread index.
+    In cache-only load shedding, anything not already cached raises Overloaded
+    without a lookup (so nothing is recorded as a miss).
+    """
+    cache = cache or message_cache
+    guild = bot.get_guild(guild_id)
+    if not guild:
+        return None, None, None
+
+    cached = cache.get(guild_id, channel_id, message_id)
+    if cached is not None:
+        target_message, channel = cached
+        return target_message, channel, guild
+    if load_shedder.cache_only:
+        load_shedder.shed("fetch")
+        raise Overloaded(f"message {message_id} is not cached")
+
+    async def _fetch() -> Tuple[Optional[MessageRecord], Optional[Any], Any]:
+        target_message, channel, guild = await fetch_target_message(
+            bot, guild_id, channel_id, message_id
+        )
+        if target_message is not None:
+            cache.put(guild_id, channel_id, message_id, (target_message, channel))
+        return target_message, channel, guild
 
-    return target_message, channel, guild
+    # Identical lookups already in flight share one fetch, run for all callers
+    return await fetch_coalescer.run((guild_id, channel_id, message_id), _fetch)
@@ -0,0 +1,166 @@
+"""Synchronous grid rendering; runs inside the image worker pool, never on the event loop."""
+
+from functools import lru_cache
+from io import BytesIO
+from typing import List, Optional, Sequence, Tuple
+
+from PIL import Image  # type: ignore[reportMissingImports]
+from PIL import ImageDraw  # type: ignore[reportMissingImports]
+
+from .config import GRID_FORMAT, GRID_QUALITY, GRID_TILE
+
+TILE = GRID_TILE
+BACKGROUND = (54, 57, 63)
+PLACEHOLDER = (79, 84, 92)
+# Non-JPEG sources above this are refused rather than decoded at full size
+MAX_SOURCE_PIXELS = 40_000_000
+# cached tiles are re-encoded once more into the grid, so keep them near-lossless
+TILE_QUALITY = 90
+
+# output format -> (PIL format name, file extension)
+_ENCODERS = {"webp": ("WEBP", "webp"), "jpeg": ("JPEG", "jpg"), "png": ("PNG", "png")}
+
+
+def has_alpha(img: Image.Image) -> bool:
+    """True if the image carries transparency (alpha band or palette transparency)."""
+    return img.mode in ("RGBA", "LA", "PA", "RGBa", "La") or (
+        img.mode == "P" and "transparency" in img.info
+    )
+
+
+def decode_tile(data: bytes, tile: int = TILE) -> Image.Image:
+    """Decode an encoded image straight to a tile-sized RGB/RGBA thumbnail.
+
+    JPEGs are decoded in draft mode (DCT scaling to the nearest size >= tile), and
+    other formats are shrunk with reduce() before the final LANCZOS pass, so a
+    12 MP photo is never expanded to full resolution. Opaque images stay RGB.
+
+    Animated GIF/WebP only ever decode their first frame: Image.open is lazy and
+    nothing here seeks. (`is_animated`/`n_frames` are avoided on purpose, since
+    answering them makes Pillow scan the later frames.)
+    """
+    img = Image.open(BytesIO(data))
+    if img.format == "JPEG":
+        img.draft("RGB", (tile, tile))
+    elif img.width * img.height > MAX_SOURCE_PIXELS:
+        raise ValueError(f"{img.width}x{img.height} source is too large to decode")
+    if img.mode in ("1", "P"):
+        # palette images resize with NEAREST, so expand them first (they are small)
+        img = img.convert("RGBA" if has_alpha(img) else "RGB")
+    img.thumbnail((tile, tile), Image.LANCZOS)
+    if has_alpha(img):
+        return img.convert("RGBA") if img.mode != "RGBA" else img
+    return img.convert("RGB") if img.mode != "RGB" else img
+
+
+def encode_image(
+    img: Image.Image, fmt: str = GRID_FORMAT, quality: int = GRID_QUALITY
+) -> Tuple[bytes, str]:
+    """Encode img with the configured format; returns (data, file extension).
+
+    JPEG cannot hold transparency, so images with alpha fall back to PNG there.
+    """
+    pil_format, ext = _ENCODERS.get(fmt, _ENCODERS["webp"])
+    if pil_format == "JPEG" and has_alpha(img):
+        pil_format, ext = _ENCODERS["png"]
+    bio = BytesIO()
+    if pil_format == "PNG":
+        img.save(bio, format="PNG", optimize=False)
+    elif pil_format == "WEBP":
+        img.save(bio, format="WEBP", quality=quality, method=4)
+    else:
+        img.save(bio, format="JPEG", quality=quality, optimize=False)
+    return bio.getvalue(), ext
+
+
+@lru_cache(maxsize=4)
+def play_badge(tile: int) -> Image.Image:
+    """Translucent circle with a play triangle, drawn over video thumbnail tiles."""
+    size = max(24, tile // 4)
+    badge = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(badge)
+    draw.ellipse((0, 0, size - 1, size - 1), fill=(0, 0, 0, 150))
+    left, top, bottom = size * 0.38, size * 0.28, size * 0.72
+    draw.polygon(
+        [(left, top), (left, bottom), (size * 0.74, size / 2)],
+        fill=(255, 255, 255, 230),
+    )
+    return badge
+
+
+def encode_tile(img: Image.Image) -> bytes:
+    """Encode a decoded tile for the tile cache: JPEG when opaque, WebP with alpha.
+
+    Both encode in well under a few milliseconds at tile size, so keeping a
+    tile barely adds to the grid it was decoded for.
+    """
+    bio = BytesIO()
+    if img.mode == "RGBA":
+        img.save(bio, format="WEBP", quality=TILE_QUALITY, method=0)
+    else:
+        img.save(bio, format="JPEG", quality=TILE_QUALITY)
+    return bio.getvalue()
+
+
+def render_grid_tiles(
+    datas: Sequence[Optional[bytes]],
+    tile: int = TILE,
+    videos: Optional[Sequence[bool]] = None,
+    keep: Optional[Sequence[bool]] = None,
+) -> Tuple[str, bytes, List[Optional[bytes]]]:
+    """`render_grid` that also returns the decoded tiles flagged in `keep`, encoded.
+
+    Inputs may be downloaded sources or previously kept tiles; a kept tile is
+    already tile-sized, so decoding it skips the resize.
+    """
+    imgs: List[Optional[Image.Image]] = []
+    for data in datas[:4]:
+        if data is None:
+            imgs.append(None)
+            continue
+        try:
+            imgs.append(decode_tile(data, tile))
+        except Exception:
+            imgs.append(None)
+
+    tiles: List[Optional[bytes]] = []
+    for idx, img in enumerate(imgs):
+        wanted = keep is not None and idx < len(keep) and keep[idx]
+        tiles.append(encode_tile(img) if wanted and img is not None else None)
+
+    # The background is opaque, so transparent tiles are flattened onto it
+    canvas = Image.new("RGB", (tile * 2, tile * 2), BACKGROUND)
+    draw = ImageDraw.Draw(canvas)
+    positions = [(0, 0), (tile, 0), (0, tile), (tile, tile)]
+    for idx, img in enumerate(imgs):
+        x, y = positions[idx]
+        if img is None:
+            # placeholder for a tile that timed out or failed
+            draw.rectangle((x + 8, y + 8, x + tile - 9, y + tile - 9), fill=PLACEHOLDER)
+            continue
+        w, h = img.size
+        offset = (x + (tile - w) // 2, y + (tile - h) // 2)
+        canvas.paste(img, offset, img if img.mode == "RGBA" else None)
+        if videos is not None and idx < len(videos) and videos[idx]:
+            badge = play_badge(tile)
+            bx = x + (tile - badge.width) // 2
+            by = y + (tile - badge.height) // 2
+            canvas.paste(badge, (bx, by), badge)
+
+    data, ext = encode_image(canvas)
+    return f"grid.{ext}", data, tiles
+
+
+def render_grid(
+    datas: Sequence[Optional[bytes]],
+    tile: int = TILE,
+    videos: Optional[Sequence[bool]] = None,
+) -> Tuple[str, bytes]:
+    """Decode up to 4 encoded images and compose a 2x2 grid; returns (filename, data).
+
+    A missing or undecodable tile is drawn as a placeholder so the grid keeps
+    its layout. Tiles flagged in `videos` are thumbnails and get a play badge.
+    Kept at module level (like render_grid_tiles) so a process pool can pickle it.
+    """
+    filename, data, _ = render_grid_tiles(datas, tile, videos)
+    return filename, data
@@ -1,59 +1,299 @@
+import re
+import time
 from io import BytesIO
-from typing import List
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
-import aiohttp
 import discord
-from PIL import Image  # type: ignore[reportMissingImports]
 
+from .config import (
+    DOWNLOAD_MAX_BYTES,
+    DOWNLOAD_TOTAL_TIMEOUT,
+    GRID_TILE,
+    TILE_MAX_BYTES,
+)
+from .downloader import download_all, download_budget
+from .image_pool import ImagePoolBusy, is_saturated, run_image_job
+from .metrics import span
+from .tile_cache import tile_cache
 
-async def compose_grid_image(attachments: List[discord.Attachment]) -> discord.File:
-    """Download up to 4 image attachments and compose a 2x2 grid PNG file (small thumbnails)."""
-    tile = 320
-    size = (tile * 2, tile * 2)
-
-    imgs: List[Image.Image] = []
-    async with aiohttp.ClientSession() as session:
-        for a in attachments[:4]:
-            try:
-                async with session.get(a.url) as resp:
-                    data = await resp.read()
-                    img = Image.open(BytesIO(data)).convert("RGBA")
-                    img.thumbnail((tile, tile), Image.LANCZOS)
-                    imgs.append(img)
-            except Exception:
-                continue
-
-    canvas = Image.new("RGBA", size, (54, 57, 63, 255))
-    positions = [(0, 0), (tile, 0), (0, tile), (tile, tile)]
-    for idx, img in enumerate(imgs):
-        x, y = positions[idx]
-        w, h = img.size
-        offset = (x + (tile - w) // 2, y + (tile - h) // 2)
-        canvas.paste(img, offset, img)
-
-    bio = BytesIO()
-    canvas.save(bio, format="PNG")
-    bio.seek(0)
-    return discord.File(bio, filename="grid.png")
-
-
-def make_message_buttons(original_url: str) -> discord.ui.View:
-    """Return a View with a colored primary button that replies the URL ephemerally and a direct link button."""
-    view = discord.ui.View()
-
-    coloured_btn = discord.ui.Button(
-        label="Open original message", style=discord.ButtonStyle.primary
+# formats the grid decodes; checked against content_type and the sniffed header
+SUPPORTED_IMAGE_TYPES = frozenset(
+    {"image/jpeg", "image/png", "image/gif", "image/webp"}
+)
+
+
+def _content_type(attachment: discord.Attachment) -> str:
+    ctype = getattr(attachment, "content_type", None) or ""
+    return ctype.split(";")[0].strip().lower()
+
+
+def is_video(attachment: discord.Attachment) -> bool:
+    return _content_type(attachment).startswith("video/")
+
+
+def tile_url(attachment: discord.Attachment, tile: int = GRID_TILE) -> str:
+    """Return a media-proxy URL asking Discord to scale the attachment to fit a tile.
+
+    Falls back to the original URL when there is no proxy URL. Dimensions are
+    fitted to the attachment's aspect ratio when known so the proxy never pads.
+    Videos ask for the proxy's JPEG thumbnail frame and GIFs for a still PNG
+    of their first frame, so neither is downloaded or decoded in full.
+    """
+    proxy_url = getattr(attachment, "proxy_url", None)
+    if not proxy_url:
+        return attachment.url
+    ctype = _content_type(attachment)
+    if ctype.startswith("video/"):
+        still: Optional[str] = "jpeg"
+    elif ctype == "image/gif":
+        still = "png"
+    else:
+        still = None
+
+    width = getattr(attachment, "width", None)
+    height = getattr(attachment, "height", None)
+    if width and height:
+        if width <= tile and height <= tile:
+            if not still:
+                return proxy_url
+        else:
+            scale = tile / max(width, height)
+            width = max(1, round(width * scale))
+            height = max(1, round(height * scale))
+    else:
+        width = height = tile
+
+    parts = urlsplit(proxy_url)
+    query = [
+        (k, v)
+        for k, v in parse_qsl(parts.query)
+        if k not in ("width", "height", "format")
+    ]
+    query += [("width", str(width)), ("height", str(height))]
+    if still:
+        query.append(("format", still))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def is_supported_image(attachment: discord.Attachment) -> bool:
+    """True if the attachment claims a format the grid can decode."""
+    return _content_type(attachment) in SUPPORTED_IMAGE_TYPES
+
+
+def is_tile_source(attachment: discord.Attachment) -> bool:
+    """True for attachments that can fill a grid tile: images, or videos via a thumbnail."""
+    return is_supported_image(attachment) or (
+        is_video(attachment) and bool(getattr(attachment, "proxy_url", None))
     )
 
-    async def _coloured_callback(interaction: discord.Interaction):
-        await interaction.response.send_message(original_url, ephemeral=True)
 
-    coloured_btn.callback = _coloured_callback
-    view.add_item(coloured_btn)
+async def download_tiles(
+    attachments: List[discord.Attachment],
+) -> List[Optional[bytes]]:
+    """Fetch proxy-resized tiles concurrently, retrying failures at the original URL.
+
+    Videos are fetched as proxy thumbnails and never retried at the original
+    URL. Unsupported content types are skipped without a request, responses are
+    sniffed so a mislabeled file is dropped after its first chunk, and the
+    original-URL retry is skipped when Attachment.size is over the byte limit.
+    The retry shares the overall download deadline, so a fallback never makes
+    the grid slower than PREVIEW_DOWNLOAD_TOTAL_TIMEOUT.
+
+    Returned bytes are reserved in download_budget; release them once decoded.
+    """
+    started = time.monotonic()
+    wanted = [i for i, a in enumerate(attachments) if is_tile_source(a)]
+    urls = [tile_url(a) for a in attachments]
+    datas: List[Optional[bytes]] = [None] * len(attachments)
+    fetched = await download_all(
+        [urls[i] for i in wanted],
+        max_bytes=TILE_MAX_BYTES,
+        sniff=True,
+        budget=download_budget,
+    )
+    for i, data in zip(wanted, fetched):
+        datas[i] = data
+
+    retry = [
+        i
+        for i in wanted
+        if datas[i] is None
+        and not is_video(attachments[i])
+        and urls[i] != attachments[i].url
+        and (getattr(attachments[i], "size", 0) or 0) <= DOWNLOAD_MAX_BYTES
+    ]
+    remaining = DOWNLOAD_TOTAL_TIMEOUT - (time.monotonic() - started)
+    if retry and remaining > 0.5:
+        try:
+            fallback = await download_all(
+                [attachments[i].url for i in retry],
+                total_timeout=remaining,
+                sniff=True,
+                budget=download_budget,
+            )
+        except BaseException:
+            # cancelled: the first batch never reaches the caller, so release it
+            download_budget.release(sum(len(d) for d in datas if d is not None))
+            raise
+        for i, data in zip(retry, fallback):
+            datas[i] = data
+    return datas
+
+
+async def compose_grid_bytes(
+    attachments: List[discord.Attachment],
+) -> Tuple[str, bytes, int]:
+    """Download up to 4 image/video attachments and compose a 2x2 grid.
+
+    Returns (filename, data, missing), where missing counts the tiles drawn as
+    placeholders because their download failed or timed out.
+
+    Tiles are fetched pre-scaled from the media proxy (videos as their
+    thumbnail frame, marked with a play badge) and decoded in the
+    image worker pool. When the pool is saturated this raises ImagePoolBusy so the
+    caller falls back to plain image embeds instead of queueing.
+
+    Tiles already in tile_cache are pasted as they are: by attachment id with
+    no download, or by content once a re-uploaded file has been downloaded.
+    Newly decoded tiles are added to the cache.
+    """
+    if is_saturated():
+        raise ImagePoolBusy("image pool saturated")
+
+    # deferred so PIL is only imported once the first grid is rendered
+    from . import grid
+
+    attachments = attachments[:4]
+    datas: List[Optional[bytes]] = [
+        await tile_cache.get_by_id(a.id) for a in attachments
+    ]
+    # content keys of downloaded tiles that are not cached yet
+    keys: List[Optional[str]] = [None] * len(attachments)
+    missing = [i for i, data in enumerate(datas) if data is None]
+    held = 0
+    try:
+        if missing:
+            with span("image_download"):
+                fetched = await download_tiles([attachments[i] for i in missing])
+            held = sum(len(d) for d in fetched if d is not None)
+            for i, data in zip(missing, fetched):
+                if data is None:
+                    continue
+                key = tile_cache.key_for(data)
+                cached = await tile_cache.get(key)
+                if cached is not None:
+                    tile_cache.link(attachments[i].id, key)
+                    datas[i] = cached
+                else:
+                    keys[i], datas[i] = key, data
+        failed = sum(1 for data in datas if data is None)
+        if failed == len(datas):
+            raise ValueError("no grid tiles could be downloaded")
+        with span("grid_compose"):
+            videos = [is_video(a) for a in attachments]
+            keep = [key is not None and tile_cache.enabled for key in keys]
+            filename, data, tiles = await run_image_job(
+                grid.render_grid_tiles, datas, grid.TILE, videos, keep
+            )
+    finally:
+        # encoded tiles are no longer needed once the grid is rendered
+        download_budget.release(held)
+    for attachment, key, tile in zip(attachments, keys, tiles):
+        if key is not None and tile is not None:
+            tile_cache.put(key, tile, attachment.id)
+    return filename, data, failed
+
+
+async def compose_grid_image(attachments: List[discord.Attachment]) -> discord.File:
+    """Download up to 4 image/video attachments and compose a 2x2 grid file (small thumbnails)."""
+    filename, data, _ = await compose_grid_bytes(attachments)
+    return discord.File(BytesIO(data), filename=filename)
+
+
+_MESSAGE_URL = re.compile(r"/channels/(\d+)/(\d+)/(\d+)")
+
+
+class OpenOriginalButton(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=r"preview:open:(?P<guild_id>\d+):(?P<channel_id>\d+):(?P<message_id>\d+)",
+):
+    """Primary button that replies the original message URL ephemerally.
+
+    The target lives in the custom_id, so one class registered with
+    `bot.add_dynamic_items` serves every preview, keeps no per-message state
+    and keeps working after a restart.
+    """
+
+    def __init__(
+        self,
+        guild_id: int,
+        channel_id: int,
+        message_id: int,
+        label: str = "Open original message",
+    ) -> None:
+        super().__init__(
+            discord.ui.Button(
+                label=label,
+                style=discord.ButtonStyle.primary,
+                custom_id=f"preview:open:{guild_id}:{channel_id}:{message_id}",
+            )
+        )
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.message_id = message_id
+
+    @classmethod
+    async def from_custom_id(
+        cls,
+        interaction: discord.Interaction,
+        item: discord.ui.Item,
+        match: "re.Match[str]",
+    ) -> "OpenOriginalButton":
+        return cls(
+            int(match["guild_id"]),
+            int(match["channel_id"]),
+            int(match["message_id"]),
+            getattr(item, "label", None) or "Open original message",
+        )
+
+    @property
+    def url(self) -> str:
+        return f"https://discord.com/channels/{self.guild_id}/{self.channel_id}/{self.message_id}"
+
+    async def callback(self, interaction: discord.Interaction) -> None:
+        await interaction.response.send_message(self.url, ephemeral=True)
+
+
+def make_message_buttons(
+    original_url: str,
+    view: Optional[discord.ui.View] = None,
+    number: Optional[int] = None,
+) -> discord.ui.View:
+    """Return a View with a colored primary button that replies the URL ephemerally and a direct link button.
+
+    Pass an existing view to append the pair to it; `number` labels the pair when
+    one reply carries several previews. The view has no timeout and only holds a
+    dynamic item and a link button, so discord.py does not keep it per message.
+    """
+    if view is None:
+        view = discord.ui.View(timeout=None)
+    suffix = f" #{number}" if number is not None else ""
+
+    match = _MESSAGE_URL.search(original_url)
+    if match:
+        guild_id, channel_id, message_id = (int(x) for x in match.groups())
+        view.add_item(
+            OpenOriginalButton(
+                guild_id, channel_id, message_id, f"Open original message{suffix}"
+            )
+        )
 
     try:
         link_btn = discord.ui.Button(
-            label="Direct link", url=original_url, style=discord.ButtonStyle.link
+            label=f"Direct link{suffix}",
+            url=original_url,
+            style=discord.ButtonStyle.link,
         )
         view.add_item(link_btn)
     except Exception:
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from .config import IMAGE_EXECUTOR, IMAGE_QUEUE_LIMIT, IMAGE_WORKERS
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[Executor] = None
+_inflight = 0
+
+
+class ImagePoolBusy(Exception):
+    """Raised instead of queueing when the image pool already holds its limit of jobs."""
+
+
+def get_executor() -> Executor:
+    """Return the shared image executor (thread or process pool per PREVIEW_IMAGE_EXECUTOR)."""
+    global _executor
+    if _executor is None:
+        if IMAGE_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(
+                max_workers=IMAGE_WORKERS, thread_name_prefix="preview-image"
+            )
+        logger.info(f"Image pool: {IMAGE_EXECUTOR} x{IMAGE_WORKERS}")
+    return _executor
+
+
+def is_saturated() -> bool:
+    """True when running + queued jobs have reached PREVIEW_IMAGE_QUEUE_LIMIT."""
+    return _inflight >= IMAGE_QUEUE_LIMIT
+
+
+async def run_image_job(func: Callable[..., Any], *args: Any) -> Any:
+    """Run func(*args) in the image pool, or raise ImagePoolBusy if it is saturated."""
+    global _inflight
+    if is_saturated():
+        raise ImagePoolBusy(f"{_inflight} image jobs in flight")
+    loop = asyncio.get_running_loop()
+    job = get_executor().submit(func, *args)
+    _inflight += 1
+    # a cancelled caller does not stop a running worker, so the job counts
+    # until the executor itself reports it finished
+    job.add_done_callback(lambda _: _job_done(loop))
+    return await asyncio.wrap_future(job, loop=loop)
+
+
+def _job_done(loop: asyncio.AbstractEventLoop) -> None:
+    """Executor callback (any thread): count the job as finished on the loop."""
+    try:
+        loop.call_soon_threadsafe(_finish_job)
+    except RuntimeError:
+        # the loop already closed (shutdown_pool at exit cancels queued jobs)
+        pass
+
+
+def _finish_job() -> None:
+    global _inflight
+    _inflight -= 1
+
+
+def stats() -> Dict[str, int]:
+    return {"inflight": _inflight, "limit": IMAGE_QUEUE_LIMIT}
+
+
+def shutdown_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
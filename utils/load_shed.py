@@ -0,0 +1,167 @@
+"""
+Event-loop lag monitor and load shedding
+A sampler measures how late the event loop wakes from a short sleep. When the
+smoothed lag crosses a tier's threshold the preview pipeline sheds more work,
+tier by tier:
+
+    1 NO_GRID       send plain image embeds instead of composing a grid
+    2 NO_ARCHIVED   also skip archived-thread searches
+    3 CACHE_ONLY    answer only previews whose message is already cached
+
+Tiers escalate as soon as the lag crosses them, but step back down only after
+the lag has stayed below `recover_ratio` of the tier's threshold for
+`recover_after` seconds, so the mode does not flap around a threshold.
+"""
+
+import asyncio
+import logging
+import time
+from enum import IntEnum
+from typing import Dict, Optional, Sequence
+
+from .config import (
+    LAG_CACHE_ONLY,
+    LAG_INTERVAL,
+    LAG_NO_ARCHIVED,
+    LAG_NO_GRID,
+    LAG_RECOVER_RATIO,
+    LAG_RECOVER_SECONDS,
+)
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """A lookup was refused by cache-only load shedding, not found missing."""
+
+
+class LoadLevel(IntEnum):
+    NORMAL = 0
+    NO_GRID = 1
+    NO_ARCHIVED = 2
+    CACHE_ONLY = 3
+
+
+class LoadShedder:
+    """Turns event-loop lag samples into a LoadLevel with hysteresis."""
+
+    def __init__(
+        self,
+        thresholds: Sequence[float] = (LAG_NO_GRID, LAG_NO_ARCHIVED, LAG_CACHE_ONLY),
+        interval: float = LAG_INTERVAL,
+        recover_ratio: float = LAG_RECOVER_RATIO,
+        recover_after: float = LAG_RECOVER_SECONDS,
+        smoothing: float = 0.3,
+    ) -> None:
+        # thresholds[i] is the lag in seconds that enters level i + 1 (0 disables it)
+        self.thresholds = tuple(thresholds)
+        self.interval = interval
+        self.recover_ratio = recover_ratio
+        self.recover_after = recover_after
+        self.smoothing = smoothing
+        self.level = LoadLevel.NORMAL
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.transitions = 0
+        self._calm_since: Optional[float] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    # -- pipeline checks -----------------------------------------------------
+
+    @property
+    def skip_grid(self) -> bool:
+        return self.level >= LoadLevel.NO_GRID
+
+    @property
+    def skip_archived(self) -> bool:
+        return self.level >= LoadLevel.NO_ARCHIVED
+
+    @property
+    def cache_only(self) -> bool:
+        return self.level >= LoadLevel.CACHE_ONLY
+
+    def shed(self, tier: str) -> None:
+        """Count one piece of work skipped because of the current level."""
+        registry.inc("preview_shed_total", {"tier": tier})
+
+    # -- sampling ------------------------------------------------------------
+
+    def _target(self, lag: float) -> LoadLevel:
+        level = LoadLevel.NORMAL
+        for i, threshold in enumerate(self.thresholds):
+            if threshold > 0 and lag >= threshold:
+                level = LoadLevel(i + 1)
+        return level
+
+    def observe(self, sample: float, now: Optional[float] = None) -> LoadLevel:
+        """Feed one lag sample (seconds) and return the resulting level."""
+        now = time.monotonic() if now is None else now
+        self.lag += self.smoothing * (sample - self.lag)
+        self.max_lag = max(self.max_lag, sample)
+        registry.observe("preview_loop_lag_seconds", sample)
+
+        target = self._target(self.lag)
+        if target > self.level:
+            self._calm_since = None
+            self._transition(target)
+        elif self.level > LoadLevel.NORMAL:
+            threshold = self.thresholds[self.level - 1]
+            if self.lag < threshold * self.recover_ratio:
+                if self._calm_since is None:
+                    self._calm_since = now
+                elif now - self._calm_since >= self.recover_after:
+                    # one enabled tier per calm period
+                    self._calm_since = now
+                    lower = self.level - 1
+                    while lower > 0 and self.thresholds[lower - 1] <= 0:
+                        lower -= 1
+                    self._transition(LoadLevel(lower))
+            else:
+                self._calm_since = None
+        return self.level
+
+    def _transition(self, level: LoadLevel) -> None:
+        previous, self.level = self.level, level
+        self.transitions += 1
+        registry.inc(
+            "preview_load_transitions_total",
+            {"from": previous.name, "to": level.name},
+        )
+        log = logger.warning if level > previous else logger.info
+        log(
+            f"Load level {previous.name} -> {level.name} "
+            f"(event loop lag {self.lag * 1000:.0f} ms)"
+        )
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.observe(max(0.0, loop.time() - expected))
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "level": int(self.level),
+            "lag_seconds": self.lag,
+            "max_lag_seconds": self.max_lag,
+            "transitions": self.transitions,
+        }
+
+
+registry.describe("preview_loop_lag_seconds", "Event loop wake-up lag samples")
+registry.describe("preview_load_transitions_total", "Load level changes")
+registry.describe("preview_shed_total", "Work skipped by load shedding, by tier")
+
+# Shared by the preview pipeline; started by the preview cog
+load_shedder = LoadShedder()
@@ -0,0 +1,244 @@
+"""
+Persistent location store
+SQLite (WAL) copy of the ThreadIndex: where messages were found, links known
+to be missing (with expiry) and guild thread membership. It is loaded into the
+index at startup so a restart does not repeat every thread crawl.
+
+All SQLite work runs on one dedicated thread; writes from the event loop are
+buffered and committed in batches.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import STORE_MAX_LOCATIONS, STORE_PATH, THREAD_LOCATION_MAX
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS locations (
+    guild_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (guild_id, message_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS locations_seen ON locations (seen_at);
+CREATE TABLE IF NOT EXISTS misses (
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (guild_id, channel_id, message_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    parent_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS threads_guild ON threads (guild_id);
+"""
+
+# (sql, params) statements waiting to be committed
+Statement = Tuple[str, Tuple[Any, ...]]
+
+
+class LocationStore:
+    """Write-behind SQLite store backing ThreadIndex across restarts."""
+
+    def __init__(
+        self, path: str = STORE_PATH, max_locations: int = STORE_MAX_LOCATIONS
+    ) -> None:
+        self.path = path
+        self.max_locations = max_locations
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pending: List[Statement] = []
+        self._lock = threading.Lock()
+        self._flush_scheduled = False
+        self.writes = 0
+        self.errors = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self._executor is not None
+
+    async def _run(self, func: Any, *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    # -- lifecycle ---------------------------------------------------------
+
+    async def open(self) -> None:
+        if self._executor is not None:
+            return
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="location-store"
+        )
+        try:
+            await self._run(self._connect)
+        except Exception:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            raise
+
+    def _connect(self) -> None:
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL only fsyncs at checkpoints; a lost tail is just a cache miss
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        conn.commit()
+        self._conn = conn
+
+    async def close(self) -> None:
+        executor = self._executor
+        if executor is None:
+            return
+        try:
+            await self._run(self._flush)
+            await self._run(self._disconnect)
+        finally:
+            executor.shutdown(wait=True)
+            self._executor = None
+
+    def _disconnect(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # -- warm-up -----------------------------------------------------------
+
+    async def warm(
+        self, index: Any, limit: int = THREAD_LOCATION_MAX
+    ) -> Dict[str, int]:
+        """Prune expired rows and load the newest state into index."""
+        if not self.is_open:
+            return {}
+        threads, locations, misses = await self._run(self._load, limit)
+        index.load(threads, locations, misses)
+        counts = {
+            "threads": len(threads),
+            "locations": len(locations),
+            "misses": len(misses),
+        }
+        logger.info(
+            f"Warmed thread index from {self.path}: {counts['threads']} thread(s), "
+            f"{counts['locations']} location(s), {counts['misses']} miss(es)"
+        )
+        return counts
+
+    def _load(self, limit: int) -> Tuple[List[Any], List[Any], List[Any]]:
+        conn = self._conn
+        assert conn is not None
+        now = time.time()
+        conn.execute("DELETE FROM misses WHERE expires_at <= ?", (now,))
+        conn.execute(
+            "DELETE FROM locations WHERE seen_at < (SELECT seen_at FROM locations"
+            " ORDER BY seen_at DESC LIMIT 1 OFFSET ?)",
+            (self.max_locations,),
+        )
+        conn.commit()
+        threads = conn.execute(
+            "SELECT guild_id, thread_id, parent_id FROM threads"
+        ).fetchall()
+        # oldest first, so the newest end up most recently used in the index LRU
+        locations = conn.execute(
+            "SELECT guild_id, message_id, channel_id FROM ("
+            " SELECT * FROM locations ORDER BY seen_at DESC LIMIT ?"
+            ") ORDER BY seen_at",
+            (limit,),
+        ).fetchall()
+        misses = [
+            (g, c, m, expires - now)
+            for g, c, m, expires in conn.execute(
+                "SELECT guild_id, channel_id, message_id, expires_at FROM misses"
+                " ORDER BY expires_at"
+            )
+        ]
+        return threads, locations, misses
+
+    # -- write-through from ThreadIndex --------------------------------------
+
+    def _write(self, sql: str, params: Tuple[Any, ...]) -> None:
+        if self._executor is None:
+            return
+        with self._lock:
+            self._pending.append((sql, params))
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        self._executor.submit(self._flush)
+
+    def _flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._flush_scheduled = False
+        if not pending or self._conn is None:
+            return
+        try:
+            with self._conn:
+                for sql, params in pending:
+                    self._conn.execute(sql, params)
+            self.writes += len(pending)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Location store write failed ({len(pending)} rows): {e}")
+
+    def put_thread(self, guild_id: int, thread_id: int, parent_id: int) -> None:
+        self._write(
+            "INSERT OR REPLACE INTO threads (thread_id, guild_id, parent_id)"
+            " VALUES (?, ?, ?)",
+            (thread_id, guild_id, parent_id),
+        )
+
+    def delete_thread(self, thread_id: int) -> None:
+        self._write("DELETE FROM threads WHERE thread_id = ?", (thread_id,))
+
+    def delete_guild(self, guild_id: int) -> None:
+        self._write("DELETE FROM threads WHERE guild_id = ?", (guild_id,))
+
+    def put_location(self, guild_id: int, message_id: int, channel_id: int) -> None:
+        self._write(
+            "INSERT OR REPLACE INTO locations (guild_id, message_id, channel_id,"
+            " seen_at) VALUES (?, ?, ?, ?)",
+            (guild_id, message_id, channel_id, time.time()),
+        )
+
+    def delete_location(self, guild_id: int, message_id: int) -> None:
+        self._write(
+            "DELETE FROM locations WHERE guild_id = ? AND message_id = ?",
+            (guild_id, message_id),
+        )
+
+    def put_miss(
+        self, guild_id: int, channel_id: int, message_id: int, ttl: float
+    ) -> None:
+        self._write(
+            "INSERT OR REPLACE INTO misses (guild_id, channel_id, message_id,"
+            " expires_at) VALUES (?, ?, ?, ?)",
+            (guild_id, channel_id, message_id, time.time() + ttl),
+        )
+
+    def delete_miss(self, guild_id: int, channel_id: int, message_id: int) -> None:
+        self._write(
+            "DELETE FROM misses WHERE guild_id = ? AND channel_id = ?"
+            " AND message_id = ?",
+            (guild_id, channel_id, message_id),
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "writes": self.writes,
+            "errors": self.errors,
+        }
+
+
+# Shared instance attached to thread_index by the cog
+location_store = LocationStore()
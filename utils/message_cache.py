@@ -0,0 +1,90 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from .config import MESSAGE_CACHE_SIZE, MESSAGE_CACHE_TTL
+
+CacheKey = Tuple[int, int, int]
+
+
+class MessageCache:
+    """Bounded TTL + LRU cache of fetched messages keyed by (guild, channel, message).
+
+    Values are whatever the caller stores (the preview path stores the
+    `(message, channel)` pair). Entries are invalidated by message id so the raw
+    gateway events, which only carry ids, can drop stale previews.
+    """
+
+    def __init__(
+        self, max_size: int = MESSAGE_CACHE_SIZE, ttl: float = MESSAGE_CACHE_TTL
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+        # message_id -> keys, since links may name a parent channel instead of the thread
+        self._by_message: Dict[int, Set[CacheKey]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, guild_id: int, channel_id: int, message_id: int) -> Optional[Any]:
+        key = (guild_id, channel_id, message_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, value = entry
+        if expires <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, guild_id: int, channel_id: int, message_id: int, value: Any) -> None:
+        if self.max_size <= 0:
+            return
+        key = (guild_id, channel_id, message_id)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        self._by_message.setdefault(message_id, set()).add(key)
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, message_id: int) -> None:
+        """Drop every entry for message_id (edit, delete or reaction change)."""
+        for key in self._by_message.pop(message_id, set()):
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_message.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _remove(self, key: CacheKey) -> None:
+        self._entries.pop(key, None)
+        keys = self._by_message.get(key[2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_message[key[2]]
+
+
+# Shared instance used by on_message and /preview
+message_cache = MessageCache()
@@ -0,0 +1,194 @@
+"""
+Compact message records
+The preview only reads a handful of message fields, so fetched messages are
+decoded into small __slots__ records instead of full discord.Message objects
+(author Member, mentions, components, ...). Records come either straight from
+the raw REST payload or from an existing discord.Message.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+import discord
+
+CDN_URL = "https://cdn.discordapp.com"
+
+
+class AttachmentRecord:
+    """The attachment metadata used by the embed builder and grid pipeline."""
+
+    __slots__ = (
+        "id",
+        "filename",
+        "url",
+        "proxy_url",
+        "content_type",
+        "size",
+        "width",
+        "height",
+    )
+
+    def __init__(
+        self,
+        attachment_id: int,
+        filename: str,
+        url: str,
+        proxy_url: Optional[str],
+        content_type: Optional[str],
+        size: int,
+        width: Optional[int],
+        height: Optional[int],
+    ) -> None:
+        self.id = attachment_id
+        self.filename = filename
+        self.url = url
+        self.proxy_url = proxy_url
+        self.content_type = content_type
+        self.size = size
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def from_payload(cls, data: Dict[str, Any]) -> "AttachmentRecord":
+        return cls(
+            int(data["id"]),
+            data.get("filename", ""),
+            data.get("url", ""),
+            data.get("proxy_url"),
+            data.get("content_type"),
+            data.get("size", 0),
+            data.get("width"),
+            data.get("height"),
+        )
+
+    @classmethod
+    def from_attachment(cls, attachment: Any) -> "AttachmentRecord":
+        return cls(
+            attachment.id,
+            getattr(attachment, "filename", ""),
+            attachment.url,
+            getattr(attachment, "proxy_url", None),
+            getattr(attachment, "content_type", None),
+            getattr(attachment, "size", 0),
+            getattr(attachment, "width", None),
+            getattr(attachment, "height", None),
+        )
+
+
+class MessageRecord:
+    """The fields of a message that a preview shows.
+
+    `reactions` holds (emoji text, count) pairs. `guild` is the cached Guild
+    the message belongs to, used for the footer name and icon.
+    """
+
+    __slots__ = (
+        "id",
+        "channel_id",
+        "guild",
+        "content",
+        "author_name",
+        "author_avatar",
+        "created_at",
+        "edited_at",
+        "reactions",
+        "attachments",
+    )
+
+    def __init__(
+        self,
+        message_id: int,
+        channel_id: int,
+        guild: Optional[Any],
+        content: str,
+        author_name: str,
+        author_avatar: Optional[str],
+        edited_at: Optional[datetime],
+        reactions: Tuple[Tuple[str, int], ...],
+        attachments: Tuple[AttachmentRecord, ...],
+        created_at: Optional[datetime] = None,
+    ) -> None:
+        self.id = message_id
+        self.channel_id = channel_id
+        self.guild = guild
+        self.content = content
+        self.author_name = author_name
+        self.author_avatar = author_avatar
+        self.created_at = created_at or discord.utils.snowflake_time(message_id)
+        self.edited_at = edited_at
+        self.reactions = reactions
+        self.attachments = attachments
+
+    @classmethod
+    def from_payload(
+        cls, data: Dict[str, Any], guild: Optional[Any] = None
+    ) -> "MessageRecord":
+        """Decode a raw message object as returned by GET /channels/{id}/messages/{id}."""
+        author = data.get("author") or {}
+        member = data.get("member") or {}
+        name = (
+            member.get("nick")
+            or author.get("global_name")
+            or author.get("username")
+            or "Unknown"
+        )
+        return cls(
+            int(data["id"]),
+            int(data["channel_id"]),
+            guild,
+            data.get("content", ""),
+            name,
+            _avatar_url(author),
+            discord.utils.parse_time(data.get("edited_timestamp")),
+            tuple(
+                (_emoji_text(r.get("emoji") or {}), r.get("count", 0))
+                for r in data.get("reactions") or ()
+            ),
+            tuple(
+                AttachmentRecord.from_payload(a) for a in data.get("attachments") or ()
+            ),
+        )
+
+    @classmethod
+    def from_message(cls, message: Any) -> "MessageRecord":
+        """Copy the preview fields out of a discord.Message (or a stand-in)."""
+        author = message.author
+        avatar = getattr(author, "display_avatar", None)
+        channel = getattr(message, "channel", None)
+        return cls(
+            message.id,
+            getattr(channel, "id", 0),
+            getattr(message, "guild", None),
+            message.content or "",
+            getattr(author, "display_name", None) or "Unknown",
+            str(avatar.url) if avatar else None,
+            getattr(message, "edited_at", None),
+            tuple((str(r.emoji), r.count) for r in message.reactions),
+            tuple(AttachmentRecord.from_attachment(a) for a in message.attachments),
+            getattr(message, "created_at", None),
+        )
+
+
+def _avatar_url(author: Dict[str, Any]) -> Optional[str]:
+    """Same URLs discord.py builds for User.display_avatar."""
+    user_id = author.get("id")
+    if user_id is None:
+        return None
+    avatar = author.get("avatar")
+    if avatar:
+        fmt = "gif" if avatar.startswith("a_") else "png"
+        return f"{CDN_URL}/avatars/{user_id}/{avatar}.{fmt}?size=1024"
+    discriminator = author.get("discriminator") or "0"
+    if discriminator == "0":
+        index = (int(user_id) >> 22) % 6
+    else:
+        index = int(discriminator) % 5
+    return f"{CDN_URL}/embed/avatars/{index}.png"
+
+
+def _emoji_text(emoji: Dict[str, Any]) -> str:
+    """Render a reaction emoji the way str(PartialEmoji) does."""
+    if emoji.get("id"):
+        prefix = "a" if emoji.get("animated") else ""
+        return f"<{prefix}:{emoji.get('name')}:{emoji['id']}>"
+    return emoji.get("name") or ""
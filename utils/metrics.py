@@ -0,0 +1,182 @@
+"""
+In-process metrics for the preview pipeline
+Counters, latency histograms and scrape-time collectors, rendered in the
+Prometheus text format by an optional local HTTP endpoint.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(labels: Optional[Dict[str, str]]) -> Labels:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    inner = ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in pairs)
+    return "{" + inner + "}"
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self) -> None:
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.total += value
+        self.count += 1
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._help: Dict[str, str] = {}
+        self._collectors: Dict[str, Callable[[], List[Sample]]] = {}
+
+    def describe(self, name: str, text: str) -> None:
+        self._help[name] = text
+
+    def inc(
+        self, name: str, labels: Optional[Dict[str, str]] = None, amount: float = 1
+    ) -> None:
+        series = self._counters.setdefault(name, {})
+        key = _labels(labels)
+        series[key] = series.get(key, 0) + amount
+
+    def observe(
+        self, name: str, value: float, labels: Optional[Dict[str, str]] = None
+    ) -> None:
+        series = self._histograms.setdefault(name, {})
+        key = _labels(labels)
+        hist = series.get(key)
+        if hist is None:
+            hist = series[key] = _Histogram()
+        hist.observe(value)
+
+    def register_collector(
+        self, key: str, collector: Callable[[], List[Sample]]
+    ) -> None:
+        """Add a callable returning (name, labels, value) gauges at scrape time.
+
+        Registering the same key again replaces the collector, so reloading a
+        cog does not duplicate its gauges.
+        """
+        self._collectors[key] = collector
+
+    def counter_value(
+        self, name: str, labels: Optional[Dict[str, str]] = None
+    ) -> float:
+        return self._counters.get(name, {}).get(_labels(labels), 0)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for name, series in sorted(self._counters.items()):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series.items():
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+
+        for name, series in sorted(self._histograms.items()):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, hist in series.items():
+                cumulative = 0
+                for bound, count in zip(BUCKETS, hist.counts):
+                    cumulative += count
+                    le = _format_labels(labels, ("le", f"{bound:g}"))
+                    lines.append(f"{name}_bucket{le} {cumulative}")
+                le = _format_labels(labels, ("le", "+Inf"))
+                lines.append(f"{name}_bucket{le} {hist.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {hist.total:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {hist.count}")
+
+        gauges: Dict[str, List[Tuple[Labels, float]]] = {}
+        for collector in self._collectors.values():
+            try:
+                for name, labels, value in collector():
+                    gauges.setdefault(name, []).append((_labels(labels), value))
+            except Exception as e:
+                logger.debug(f"Metrics collector failed: {e}")
+        for name, series in sorted(gauges.items()):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in series:
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+registry.describe("preview_stage_seconds", "Time spent in each preview pipeline stage")
+registry.describe("preview_rest_calls_total", "Discord REST calls made by the pipeline")
+registry.describe("preview_requests_total", "Preview requests by entry point")
+registry.describe("preview_grid_failures_total", "Grid compositions that fell back")
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a pipeline stage into preview_stage_seconds{stage=...}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(
+            "preview_stage_seconds", time.perf_counter() - start, {"stage": stage}
+        )
+
+
+def count_rest(route: str) -> None:
+    registry.inc("preview_rest_calls_total", {"route": route})
+
+
+def stats_collector(
+    prefix: str, stats: Callable[[], Dict[str, int]]
+) -> Callable[[], List[Sample]]:
+    """Expose a `stats()` dict (cache, limiter, coalescer) as `<prefix>_<key>` gauges."""
+
+    def collect() -> List[Sample]:
+        return [(f"{prefix}_{key}", {}, float(value)) for key, value in stats().items()]
+
+    return collect
+
+
+async def start_metrics_server(host: str, port: int):
+    """Serve GET /metrics on host:port; returns the aiohttp runner (call cleanup())."""
+    from aiohttp import web
+
+    async def handle(request: "web.Request") -> "web.Response":
+        return web.Response(
+            text=registry.render(), content_type="text/plain", charset="utf-8"
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    return runner
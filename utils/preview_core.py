@@ -1,99 +1,296 @@
+import asyncio
 import logging
-from typing import Optional
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import discord
 from discord.ext import commands
 
+from .config import LINK_CONCURRENCY
 from .embed_builder import create_preview_embed
-from .fetcher import fetch_target_message
-from .helpers import compose_grid_image, make_message_buttons
+from .fetcher import get_target_message
+from .helpers import compose_grid_bytes, is_tile_source, make_message_buttons
+from .load_shed import Overloaded, load_shedder
+from .message_record import MessageRecord
+from .metrics import count_rest, registry, span
+from .render_cache import RenderedPreview, render_cache
+from .scheduler import DeadlineExceeded, rest_scheduler, time_left
 
 logger = logging.getLogger(__name__)
 
+# Discord limits for a single message
+MAX_EMBEDS = 10
+MAX_EMBED_CHARS = 6000
+MAX_FILES = 10
+DEFAULT_FILESIZE_LIMIT = 8 * 1024 * 1024
 
-async def preview_message_link(
-    bot: commands.Bot,
-    source_message: discord.Message,
-    guild_id: int,
-    channel_id: int,
-    message_id: int,
-) -> None:
-    """Fetch a message and send preview reply to source_message.
+Link = Tuple[int, int, int]
 
-    This is extracted from the Cog to reduce file size.
+
+async def render_preview(
+    target_message: MessageRecord, channel: Any, original_url: str
+) -> RenderedPreview:
+    """Render a fetched message into a transport-agnostic preview payload.
+
+    The payload holds serialized embeds, file payloads and the button target;
+    delivering it is left to a sink (`send_previews` / `send_followup`).
+    A grid that was expected but is missing (skipped by load shedding, or
+    failed on a busy pool or a download), or one with tiles left blank by a
+    failed download, marks the payload degraded.
     """
+    base_embed = create_preview_embed(target_message, channel)
+
+    # Collect attachments
+    image_attachments = []
+    video_attachments = []
+    for a in target_message.attachments:
+        ctype = a.content_type or ""
+        if ctype.startswith("image/"):
+            image_attachments.append(a)
+        elif ctype.startswith("video/"):
+            video_attachments.append(a)
+
+    embeds = []
+
+    if image_attachments:
+        base_embed.set_image(url=image_attachments[0].url)
+        for att in image_attachments[1:4]:
+            img_embed = discord.Embed(color=0x5865F2)
+            img_embed.set_image(url=att.url)
+            embeds.append(img_embed)
+
+    if video_attachments:
+        video_links = "\n".join(f"[Video]({v.url})" for v in video_attachments[:4])
+        base_embed.add_field(name="Videos", value=video_links, inline=False)
+
+    # Images and videos (as thumbnail frames) share one grid, in message order
+    tiles = [a for a in target_message.attachments if is_tile_source(a)][:4]
+    files: List[Tuple[str, bytes]] = []
+    degraded = False
+    if len(tiles) > 1 and load_shedder.skip_grid:
+        # overloaded: the plain image embeds above are sent instead
+        load_shedder.shed("grid")
+        degraded = True
+    elif len(tiles) > 1:
+        try:
+            filename, data, missing = await compose_grid_bytes(tiles)
+            if missing:
+                # placeholder tiles from a CDN hiccup must not be cached
+                degraded = True
+            # unique per message so several grids can share one reply
+            filename = f"{target_message.id}_{filename}"
+            files = [(filename, data)]
+            base_embed.set_image(url=f"attachment://{filename}")
+            embeds = []
+        except Exception as e:
+            # the preview still goes out with plain image embeds
+            logger.warning(
+                f"Grid fallback for message {target_message.id}: "
+                f"{type(e).__name__}: {e}"
+            )
+            registry.inc("preview_grid_failures_total", {"reason": type(e).__name__})
+            degraded = True
+
+    return RenderedPreview(
+        [e.to_dict() for e in [base_embed] + embeds], files, original_url, degraded
+    )
+
+
+async def build_preview(
+    bot: commands.Bot, guild_id: int, channel_id: int, message_id: int
+) -> Optional[RenderedPreview]:
+    """Fetch a message and render its preview, reusing the render cache.
+
+    This is the single pipeline behind both on_message and /preview.
+    Returns None (after logging) when the message cannot be previewed. Raises
+    DeadlineExceeded when the current request's deadline passes first, and
+    Overloaded when load shedding refuses to fetch an uncached message.
+    """
+    with span("preview_total"):
+        try:
+            return await asyncio.wait_for(
+                _build_preview(bot, guild_id, channel_id, message_id), time_left()
+            )
+        except asyncio.TimeoutError:
+            raise rest_scheduler.expire() from None
+
+
+async def _build_preview(
+    bot: commands.Bot, guild_id: int, channel_id: int, message_id: int
+) -> Optional[RenderedPreview]:
     try:
-        target_message, channel, guild = await fetch_target_message(
+        target_message, channel, guild = await get_target_message(
             bot, guild_id, channel_id, message_id
         )
         if not target_message:
             logger.warning(
                 f"Message {message_id} not found in channel/thread {channel_id} (guild {guild_id})"
             )
-            return
+            return None
 
-        base_embed = create_preview_embed(target_message, channel)
+        # Repeat previews of an unchanged message skip rendering entirely
+        edited_at = getattr(target_message, "edited_at", None)
+        cached = render_cache.get(target_message.id, edited_at)
+        if cached is not None:
+            return cached
 
-        # Collect attachments
-        image_attachments = []
-        video_attachments = []
-        for a in target_message.attachments:
-            ctype = a.content_type or ""
-            if ctype.startswith("image/"):
-                image_attachments.append(a)
-            elif ctype.startswith("video/"):
-                video_attachments.append(a)
+        original_url = (
+            f"https://discord.com/channels/{guild_id}/{channel_id}/{message_id}"
+        )
+        with span("render"):
+            rendered = await render_preview(target_message, channel, original_url)
+        # a degraded render (shed, failed or partial grid) would outlive its cause
+        if not rendered.degraded:
+            render_cache.put(target_message.id, edited_at, rendered)
+        return rendered
 
-        embeds = []
+    except (DeadlineExceeded, Overloaded):
+        raise
+    except discord.NotFound:
+        logger.warning(f"Message {message_id} not found in channel {channel_id}")
+    except discord.Forbidden:
+        logger.warning(
+            f"No permission to view message {message_id} in channel {channel_id}"
+        )
+    except Exception as e:
+        logger.error(f"Error previewing message link: {e}")
+    return None
 
-        if image_attachments:
-            base_embed.set_image(url=image_attachments[0].url)
-            for att in image_attachments[1:4]:
-                img_embed = discord.Embed(color=0x5865F2)
-                img_embed.set_image(url=att.url)
-                embeds.append(img_embed)
 
-        if video_attachments:
-            video_links = "\n".join(f"[Video]({v.url})" for v in video_attachments[:4])
-            base_embed.add_field(name="Videos", value=video_links, inline=False)
+def pack_previews(
+    previews: Sequence[RenderedPreview],
+    filesize_limit: int = DEFAULT_FILESIZE_LIMIT,
+) -> List[List[RenderedPreview]]:
+    """Group previews, in order, into as few messages as Discord's limits allow.
 
-        view = None
+    Limits per message: 10 embeds, 6000 embed characters, 10 files and the
+    guild's upload size. A preview that alone exceeds a limit is sent on its own.
+    """
+    batches: List[List[RenderedPreview]] = []
+    current: List[RenderedPreview] = []
+    embeds = chars = files = nbytes = 0
+    for preview in previews:
+        fits = (
+            embeds + len(preview.embeds) <= MAX_EMBEDS
+            and chars + preview.chars <= MAX_EMBED_CHARS
+            and files + len(preview.files) <= MAX_FILES
+            and nbytes + preview.file_bytes <= filesize_limit
+        )
+        if current and not fits:
+            batches.append(current)
+            current = []
+            embeds = chars = files = nbytes = 0
+        current.append(preview)
+        embeds += len(preview.embeds)
+        chars += preview.chars
+        files += len(preview.files)
+        nbytes += preview.file_bytes
+    if current:
+        batches.append(current)
+    return batches
+
+
+def payload_kwargs(previews: Sequence[RenderedPreview]) -> Dict[str, Any]:
+    """Build send() keyword arguments (embeds, files, view) for a batch of previews."""
+    send_kwargs: Dict[str, Any] = {}
+    send_kwargs["embeds"] = [
+        discord.Embed.from_dict(d) for p in previews for d in p.embeds
+    ]
+    view = None
+    numbered = len(previews) > 1
+    for number, preview in enumerate(previews, start=1):
+        if not preview.original_url:
+            continue
         try:
-            original_url = (
-                f"https://discord.com/channels/{guild_id}/{channel_id}/{message_id}"
+            view = make_message_buttons(
+                preview.original_url, view, number if numbered else None
             )
-            view = make_message_buttons(original_url)
         except Exception:
-            view = None
+            pass
+    if view:
+        send_kwargs["view"] = view
+    files = [
+        discord.File(BytesIO(data), filename=name)
+        for p in previews
+        for name, data in p.files
+    ]
+    if files:
+        send_kwargs["files"] = files
+    return send_kwargs
+
+
+async def send_previews(
+    source_message: discord.Message, previews: Sequence[RenderedPreview]
+) -> None:
+    """Message sink: reply to source_message with every preview in the batch."""
+    count_rest("send_message")
+    with span("discord_send"):
+        async with rest_scheduler.slot():
+            await source_message.reply(**payload_kwargs(previews))
+
+
+async def send_followup(
+    interaction: discord.Interaction, previews: Sequence[RenderedPreview]
+) -> None:
+    """Interaction sink: send the batch as a followup to a deferred interaction."""
+    count_rest("interaction_followup")
+    with span("discord_send"):
+        async with rest_scheduler.slot():
+            await interaction.followup.send(**payload_kwargs(previews))
+
 
-        files = None
-        if len(image_attachments) > 1:
+async def preview_message_links(
+    bot: commands.Bot, source_message: discord.Message, links: Sequence[Link]
+) -> None:
+    """Resolve links concurrently and reply with as few batched messages as possible.
+
+    Link order is preserved; a link that fails is skipped and the rest still go out.
+    """
+    semaphore = asyncio.Semaphore(LINK_CONCURRENCY)
+
+    async def _build(link: Link) -> Optional[RenderedPreview]:
+        async with semaphore:
             try:
-                tiles = image_attachments[:4]
-                composed = await compose_grid_image(tiles)
-                files = [composed]
-                base_embed.set_image(url="attachment://grid.png")
-                embeds = []
-            except Exception as e:
-                logger.debug(f"Failed to compose grid image: {e}")
+                return await build_preview(bot, *link)
+            except DeadlineExceeded:
+                logger.warning(
+                    f"Preview of message {link[2]} dropped past its deadline"
+                )
+                return None
+            except Overloaded:
+                logger.debug(f"Preview of message {link[2]} shed under load")
+                return None
+
+    results = await asyncio.gather(*(_build(link) for link in links))
+    previews = [p for p in results if p is not None]
+    if not previews:
+        return
 
+    guild = getattr(source_message, "guild", None)
+    filesize_limit = getattr(guild, "filesize_limit", None) or DEFAULT_FILESIZE_LIMIT
+    for batch in pack_previews(previews, filesize_limit):
         try:
-            send_kwargs = {}
-            send_kwargs["embeds"] = [base_embed] + embeds if embeds else [base_embed]
-            if view:
-                send_kwargs["view"] = view
-            if files:
-                await source_message.reply(files=files, **send_kwargs)
-            else:
-                await source_message.reply(**send_kwargs)
+            await send_previews(source_message, batch)
         except discord.HTTPException as e:
             logger.error(f"Failed to send preview: {e}")
+        except DeadlineExceeded:
+            logger.warning(
+                f"Dropped preview reply to {source_message.id} past its deadline"
+            )
+            return
 
-    except discord.NotFound:
-        logger.warning(f"Message {message_id} not found in channel {channel_id}")
-    except discord.Forbidden:
-        logger.warning(
-            f"No permission to view message {message_id} in channel {channel_id}"
-        )
-    except Exception as e:
-        logger.error(f"Error previewing message link: {e}")
+
+async def preview_message_link(
+    bot: commands.Bot,
+    source_message: discord.Message,
+    guild_id: int,
+    channel_id: int,
+    message_id: int,
+) -> None:
+    """Fetch a message and send preview reply to source_message.
+
+    This is extracted from the Cog to reduce file size.
+    """
+    await preview_message_links(
+        bot, source_message, [(guild_id, channel_id, message_id)]
+    )
@@ -0,0 +1,102 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from .config import (
+    RATE_BUCKETS_MAX,
+    RATE_CHANNEL_BURST,
+    RATE_CHANNEL_PER_MINUTE,
+    RATE_GUILD_BURST,
+    RATE_GUILD_PER_MINUTE,
+    RATE_USER_BURST,
+    RATE_USER_PER_MINUTE,
+)
+
+
+class TokenBucket:
+    """Classic token bucket: `capacity` tokens, refilled at `rate` tokens per second."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def peek(self, now: Optional[float] = None) -> bool:
+        self._refill(time.monotonic() if now is None else now)
+        return self.tokens >= 1
+
+    def take(self, now: Optional[float] = None) -> bool:
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class PreviewRateLimiter:
+    """Per-user, per-channel and per-guild token buckets for link previews.
+
+    A preview is allowed only if all three scopes have a token, and then one
+    token is taken from each. Idle buckets are evicted LRU past `max_buckets`.
+    """
+
+    def __init__(
+        self,
+        user: Tuple[float, float] = (RATE_USER_PER_MINUTE, RATE_USER_BURST),
+        channel: Tuple[float, float] = (RATE_CHANNEL_PER_MINUTE, RATE_CHANNEL_BURST),
+        guild: Tuple[float, float] = (RATE_GUILD_PER_MINUTE, RATE_GUILD_BURST),
+        max_buckets: int = RATE_BUCKETS_MAX,
+    ) -> None:
+        # scope -> (tokens per minute, burst)
+        self._limits: Dict[str, Tuple[float, float]] = {
+            "user": user,
+            "channel": channel,
+            "guild": guild,
+        }
+        self._buckets: "OrderedDict[Tuple[str, int], TokenBucket]" = OrderedDict()
+        self.max_buckets = max_buckets
+        self.allowed = 0
+        self.denied = 0
+
+    def _bucket(self, scope: str, key: int) -> TokenBucket:
+        bucket = self._buckets.get((scope, key))
+        if bucket is None:
+            per_minute, burst = self._limits[scope]
+            bucket = TokenBucket(per_minute / 60.0, burst)
+            self._buckets[(scope, key)] = bucket
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end((scope, key))
+        return bucket
+
+    def allow(self, user_id: int, channel_id: int, guild_id: Optional[int]) -> bool:
+        now = time.monotonic()
+        buckets = [self._bucket("user", user_id), self._bucket("channel", channel_id)]
+        if guild_id is not None:
+            buckets.append(self._bucket("guild", guild_id))
+        if not all(b.peek(now) for b in buckets):
+            self.denied += 1
+            return False
+        for bucket in buckets:
+            bucket.take(now)
+        self.allowed += 1
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "buckets": len(self._buckets),
+            "allowed": self.allowed,
+            "denied": self.denied,
+        }
+
+
+# Shared instance used by on_message
+preview_limiter = PreviewRateLimiter()
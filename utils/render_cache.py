@@ -0,0 +1,121 @@
+import json
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import discord
+
+from .config import RENDER_CACHE_BYTES
+
+RenderKey = Tuple[int, Optional[datetime]]
+
+
+class RenderedPreview:
+    """A built preview in serializable form: embed dicts, file payloads and the button target.
+
+    `degraded` marks a render that left out part of the preview (such as the
+    grid) for a temporary reason; callers do not cache those.
+    """
+
+    __slots__ = ("embeds", "files", "original_url", "nbytes", "chars", "degraded")
+
+    def __init__(
+        self,
+        embeds: List[Dict[str, Any]],
+        files: List[Tuple[str, bytes]],
+        original_url: Optional[str],
+        degraded: bool = False,
+    ) -> None:
+        self.embeds = embeds
+        self.files = files
+        self.original_url = original_url
+        self.degraded = degraded
+        self.nbytes = sum(len(data) for _, data in files) + len(
+            json.dumps(embeds, default=str)
+        )
+        # characters counted against Discord's 6000-per-message embed limit
+        self.chars = sum(len(discord.Embed.from_dict(d)) for d in embeds)
+
+    @property
+    def file_bytes(self) -> int:
+        return sum(len(data) for _, data in self.files)
+
+
+class RenderCache:
+    """LRU cache of rendered previews keyed by (message_id, edited_at), bounded by bytes.
+
+    Grid images dominate the footprint, so the budget counts payload bytes rather
+    than entries. An edit changes edited_at and therefore the key; reaction changes
+    do not, so callers also invalidate by message id.
+    """
+
+    def __init__(self, max_bytes: int = RENDER_CACHE_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[RenderKey, RenderedPreview]" = OrderedDict()
+        self._by_message: Dict[int, Set[RenderKey]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self, message_id: int, edited_at: Optional[datetime]
+    ) -> Optional[RenderedPreview]:
+        key = (message_id, edited_at)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(
+        self, message_id: int, edited_at: Optional[datetime], entry: RenderedPreview
+    ) -> None:
+        if entry.nbytes > self.max_bytes:
+            return
+        key = (message_id, edited_at)
+        self._remove(key)
+        self._entries[key] = entry
+        self._by_message.setdefault(message_id, set()).add(key)
+        self.total_bytes += entry.nbytes
+        while self.total_bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, message_id: int) -> None:
+        for key in list(self._by_message.get(message_id, ())):
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_message.clear()
+        self.total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _remove(self, key: RenderKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.total_bytes -= entry.nbytes
+        keys = self._by_message.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_message[key[0]]
+
+
+# Shared instance used by preview_message_link
+render_cache = RenderCache()
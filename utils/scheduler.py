@@ -0,0 +1,241 @@
+"""
+REST scheduler
+Every preview fetch and send takes a slot here before calling Discord, so a
+burst of mention previews cannot starve /preview interactions of the shared
+rate limit. Waiters are served by priority class, then earliest deadline;
+work whose deadline has passed is dropped with DeadlineExceeded.
+
+The priority and deadline travel with the task through a context variable
+(`request_scope`), so helpers deep in the fetcher need no extra arguments.
+Work shared by several requests runs under a `SharedRequest` instead.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+
+from .config import (
+    DEADLINE_BACKGROUND,
+    DEADLINE_INTERACTION,
+    DEADLINE_MENTION,
+    REST_CONCURRENCY,
+)
+from .metrics import registry
+
+
+class Priority(IntEnum):
+    """Lower values are served first."""
+
+    INTERACTION = 0
+    MENTION = 1
+    BACKGROUND = 2
+
+
+DEFAULT_DEADLINES: Dict[Priority, float] = {
+    Priority.INTERACTION: DEADLINE_INTERACTION,
+    Priority.MENTION: DEADLINE_MENTION,
+    Priority.BACKGROUND: DEADLINE_BACKGROUND,
+}
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before its REST work could run."""
+
+
+class SharedRequest:
+    """The priority and deadline of work several requests wait on together.
+
+    It runs at the most urgent priority and the latest deadline among the
+    requests that joined it, so a caller that joins in-flight work is never
+    served worse than it would be on its own.
+    """
+
+    __slots__ = ("priority", "deadline")
+
+    def __init__(self) -> None:
+        self.priority = Priority.BACKGROUND
+        self.deadline = float("-inf")
+
+    def join(self) -> None:
+        """Fold the current request into this one."""
+        priority, deadline = _current()
+        self.priority = min(self.priority, priority)
+        self.deadline = max(self.deadline, deadline)
+
+
+Request = Union[Tuple[Priority, float], SharedRequest]
+
+# (priority, absolute time.monotonic() deadline) of the current request
+_request: ContextVar[Request] = ContextVar(
+    "preview_request", default=(Priority.BACKGROUND, float("inf"))
+)
+
+
+def _resolve(request: Request) -> Tuple[Priority, float]:
+    if isinstance(request, SharedRequest):
+        return request.priority, request.deadline
+    return request
+
+
+def _current() -> Tuple[Priority, float]:
+    return _resolve(_request.get())
+
+
+@contextmanager
+def request_scope(
+    priority: Priority, timeout: Optional[float] = None
+) -> Iterator[float]:
+    """Run the enclosed work (and tasks it spawns) as one prioritized request.
+
+    Yields the absolute deadline; timeout defaults to the priority's
+    PREVIEW_DEADLINE_* setting, and 0 means no deadline.
+    """
+    if timeout is None:
+        timeout = DEFAULT_DEADLINES[priority]
+    deadline = time.monotonic() + timeout if timeout > 0 else float("inf")
+    token = _request.set((priority, deadline))
+    try:
+        yield deadline
+    finally:
+        _request.reset(token)
+
+
+@contextmanager
+def shared_scope(shared: SharedRequest) -> Iterator[None]:
+    """Run the enclosed work for every request that joins `shared`."""
+    token = _request.set(shared)
+    try:
+        yield
+    finally:
+        _request.reset(token)
+
+
+def time_left() -> Optional[float]:
+    """Seconds until the current request's deadline, or None without one."""
+    _, deadline = _current()
+    if deadline == float("inf"):
+        return None
+    return deadline - time.monotonic()
+
+
+class RestScheduler:
+    """Priority + earliest-deadline-first gate over concurrent REST calls.
+
+    At most `concurrency` calls run at once (0 disables the limit, but
+    deadlines are still enforced).
+    """
+
+    def __init__(self, concurrency: int = REST_CONCURRENCY) -> None:
+        self.concurrency = concurrency
+        self._active = 0
+        # heap of (priority, deadline, seq, future, request); cancelled entries
+        # are skipped
+        self._waiters: List[Tuple[int, float, int, "asyncio.Future[None]", Request]] = (
+            []
+        )
+        self._seq = itertools.count()
+        self.granted: Dict[Priority, int] = {p: 0 for p in Priority}
+        self.expired: Dict[Priority, int] = {p: 0 for p in Priority}
+
+    def expire(self, priority: Optional[Priority] = None) -> DeadlineExceeded:
+        """Count an expired request (default: the current one); returns the error."""
+        if priority is None:
+            priority = _current()[0]
+        self.expired[priority] += 1
+        registry.inc("preview_deadline_expired_total", {"priority": priority.name})
+        return DeadlineExceeded(f"{priority.name.lower()} request past its deadline")
+
+    def _grant(self) -> None:
+        now = time.monotonic()
+        while self._waiters and (
+            self.concurrency <= 0 or self._active < self.concurrency
+        ):
+            _, _, _, future, request = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            # re-read: callers joining a shared request move its deadline later
+            if _resolve(request)[1] <= now:
+                future.cancel()
+                continue
+            self._active += 1
+            future.set_result(None)
+
+    async def acquire(self) -> None:
+        request = _request.get()
+        priority, deadline = _resolve(request)
+        start = time.monotonic()
+        if deadline <= start:
+            raise self.expire(priority)
+
+        future: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self._waiters, (priority, deadline, next(self._seq), future, request)
+        )
+        self._grant()
+        try:
+            while not future.done():
+                _, deadline = _resolve(request)
+                timeout = None
+                if deadline != float("inf"):
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                await asyncio.wait((future,), timeout=timeout)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # granted just before the cancellation landed
+                self.release()
+            future.cancel()
+            raise
+        if not future.done() or future.cancelled():
+            future.cancel()
+            raise self.expire(priority)
+
+        self.granted[priority] += 1
+        registry.observe(
+            "preview_rest_wait_seconds",
+            time.monotonic() - start,
+            {"priority": priority.name},
+        )
+
+    def release(self) -> None:
+        self._active -= 1
+        self._grant()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one REST slot for the current request while the block runs."""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, int]:
+        queued = {p: 0 for p in Priority}
+        for priority, _, _, future, _ in self._waiters:
+            if not future.done():
+                queued[Priority(priority)] += 1
+        stats = {"active": self._active, "concurrency": self.concurrency}
+        for p in Priority:
+            name = p.name.lower()
+            stats[f"queued_{name}"] = queued[p]
+            stats[f"granted_{name}"] = self.granted[p]
+            stats[f"expired_{name}"] = self.expired[p]
+        return stats
+
+
+registry.describe(
+    "preview_rest_wait_seconds", "Time spent queued for a REST slot, by priority"
+)
+registry.describe(
+    "preview_deadline_expired_total", "Requests dropped past their deadline"
+)
+
+# Shared by every preview fetch and send in this process
+rest_scheduler = RestScheduler()
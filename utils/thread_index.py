@@ -0,0 +1,190 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .config import (
+    THREAD_LOCATION_MAX,
+    THREAD_MISS_MAX,
+    THREAD_MISS_TTL,
+    THREAD_OBJECT_MAX,
+)
+
+
+class ThreadIndex:
+    """Guild-scoped thread_id -> parent_id map plus a negative cache of failed lookups.
+
+    Populated from the gateway (guild cache at startup, thread create/update/delete
+    events) so `fetch_target_message` can tell whether a channel id is a thread, and
+    which threads live under a channel, without listing threads over REST.
+    Archived threads drop out of discord.py's guild cache, so the most recently seen
+    Thread objects are also kept here (bounded) to avoid a `fetch_channel` per link.
+
+    With a store attached (see utils/location_store.py) membership, locations and
+    misses are written through to disk and reloaded with `load()` on startup.
+    """
+
+    def __init__(
+        self,
+        miss_ttl: float = THREAD_MISS_TTL,
+        max_misses: int = THREAD_MISS_MAX,
+        max_locations: int = THREAD_LOCATION_MAX,
+        max_objects: int = THREAD_OBJECT_MAX,
+    ) -> None:
+        self.miss_ttl = miss_ttl
+        self.max_misses = max_misses
+        self.max_locations = max_locations
+        self.max_objects = max_objects
+        # guild_id -> {thread_id: parent_id}
+        self._threads: Dict[int, Dict[int, int]] = {}
+        # thread_id -> Thread, most recently used last
+        self._objects: "OrderedDict[int, Any]" = OrderedDict()
+        # (guild_id, message_id) -> channel/thread id the message was found in
+        self._locations: "OrderedDict[Tuple[int, int], int]" = OrderedDict()
+        # (guild_id, channel_id, message_id) -> expiry (monotonic)
+        self._misses: "OrderedDict[Tuple[int, int, int], float]" = OrderedDict()
+        # optional write-through persistence (LocationStore)
+        self.store: Optional[Any] = None
+
+    def attach_store(self, store: Optional[Any]) -> None:
+        self.store = store
+
+    def load(
+        self,
+        threads: Iterable[Tuple[int, int, int]],
+        locations: Iterable[Tuple[int, int, int]],
+        misses: Iterable[Tuple[int, int, int, float]],
+    ) -> None:
+        """Bulk-load persisted state without writing it back.
+
+        threads are (guild, thread, parent) rows, locations (guild, message,
+        channel) oldest first, misses (guild, channel, message, seconds left).
+        """
+        for guild_id, thread_id, parent_id in threads:
+            self._threads.setdefault(guild_id, {})[thread_id] = parent_id
+        for guild_id, message_id, channel_id in locations:
+            self._set_location((guild_id, message_id), channel_id)
+        now = time.monotonic()
+        for guild_id, channel_id, message_id, remaining in misses:
+            self._set_miss((guild_id, channel_id, message_id), now + remaining)
+
+    # -- thread membership -------------------------------------------------
+
+    def add_thread(self, thread: Any) -> None:
+        """Index a discord.Thread (or anything with id/parent_id/guild)."""
+        guild = getattr(thread, "guild", None)
+        parent_id = getattr(thread, "parent_id", None)
+        if guild is None or parent_id is None:
+            return
+        threads = self._threads.setdefault(guild.id, {})
+        if threads.get(thread.id) != parent_id:
+            threads[thread.id] = parent_id
+            if self.store is not None:
+                self.store.put_thread(guild.id, thread.id, parent_id)
+        self._objects[thread.id] = thread
+        self._objects.move_to_end(thread.id)
+        while len(self._objects) > self.max_objects:
+            self._objects.popitem(last=False)
+
+    def add_guild(self, guild: Any) -> int:
+        """Index every thread in the guild's gateway cache. Returns the number indexed."""
+        threads = list(getattr(guild, "threads", []) or [])
+        for thread in threads:
+            self.add_thread(thread)
+        return len(threads)
+
+    def remove_thread(self, guild_id: int, thread_id: int) -> None:
+        self._threads.get(guild_id, {}).pop(thread_id, None)
+        self._objects.pop(thread_id, None)
+        if self.store is not None:
+            self.store.delete_thread(thread_id)
+
+    def remove_guild(self, guild_id: int) -> None:
+        for thread_id in self._threads.pop(guild_id, {}):
+            self._objects.pop(thread_id, None)
+        if self.store is not None:
+            self.store.delete_guild(guild_id)
+
+    def parent_of(self, guild_id: int, thread_id: int) -> Optional[int]:
+        """Return the parent channel id if thread_id is a known thread, else None."""
+        return self._threads.get(guild_id, {}).get(thread_id)
+
+    def get_thread(self, thread_id: int) -> Optional[Any]:
+        """Return a remembered Thread object (including archived ones) if still held."""
+        thread = self._objects.get(thread_id)
+        if thread is not None:
+            self._objects.move_to_end(thread_id)
+        return thread
+
+    def threads_under(self, guild_id: int, parent_id: int) -> List[int]:
+        """Known thread ids whose parent is parent_id, newest first."""
+        threads = self._threads.get(guild_id, {})
+        return sorted(
+            (tid for tid, pid in threads.items() if pid == parent_id), reverse=True
+        )
+
+    def thread_count(self) -> int:
+        return sum(len(t) for t in self._threads.values())
+
+    # -- message locations -------------------------------------------------
+
+    def record_location(self, guild_id: int, message_id: int, channel_id: int) -> None:
+        self._set_location((guild_id, message_id), channel_id)
+        if self.store is not None:
+            self.store.put_location(guild_id, message_id, channel_id)
+
+    def _set_location(self, key: Tuple[int, int], channel_id: int) -> None:
+        self._locations[key] = channel_id
+        self._locations.move_to_end(key)
+        while len(self._locations) > self.max_locations:
+            self._locations.popitem(last=False)
+
+    def location_of(self, guild_id: int, message_id: int) -> Optional[int]:
+        key = (guild_id, message_id)
+        channel_id = self._locations.get(key)
+        if channel_id is not None:
+            self._locations.move_to_end(key)
+        return channel_id
+
+    def forget_location(self, guild_id: int, message_id: int) -> None:
+        self._locations.pop((guild_id, message_id), None)
+        if self.store is not None:
+            self.store.delete_location(guild_id, message_id)
+
+    # -- negative cache ----------------------------------------------------
+
+    def record_miss(self, guild_id: int, channel_id: int, message_id: int) -> None:
+        key = (guild_id, channel_id, message_id)
+        self._set_miss(key, time.monotonic() + self.miss_ttl)
+        if self.store is not None:
+            self.store.put_miss(guild_id, channel_id, message_id, self.miss_ttl)
+
+    def _set_miss(self, key: Tuple[int, int, int], expires: float) -> None:
+        self._misses[key] = expires
+        self._misses.move_to_end(key)
+        while len(self._misses) > self.max_misses:
+            self._misses.popitem(last=False)
+
+    def is_miss(self, guild_id: int, channel_id: int, message_id: int) -> bool:
+        key = (guild_id, channel_id, message_id)
+        expires = self._misses.get(key)
+        if expires is None:
+            return False
+        if expires <= time.monotonic():
+            del self._misses[key]
+            return False
+        return True
+
+    def forget_miss(self, guild_id: int, channel_id: int, message_id: int) -> None:
+        if self._misses.pop((guild_id, channel_id, message_id), None) is not None:
+            if self.store is not None:
+                self.store.delete_miss(guild_id, channel_id, message_id)
+
+    def clear(self) -> None:
+        self._threads.clear()
+        self._objects.clear()
+        self._locations.clear()
+        self._misses.clear()
+
+
+# Shared instance used by the cog listeners and fetch_target_message
+thread_index = ThreadIndex()
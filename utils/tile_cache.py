@@ -0,0 +1,241 @@
+"""
+Grid tile cache
+Keeps already-resized grid tiles so an image that is re-posted, forwarded or
+linked again is pasted into the next grid without being decoded and resized.
+
+Tiles are stored under a content key (a hash of the downloaded source and the
+tile size), and attachment ids point at those keys, so a known attachment
+needs no download at all and a re-upload of the same file is recognised after
+its download. Memory is bounded by bytes; evicted tiles optionally spill to a
+disk directory, itself trimmed least recently used to its own byte budget.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import (
+    GRID_TILE,
+    TILE_CACHE_BYTES,
+    TILE_CACHE_DIR,
+    TILE_CACHE_DISK_BYTES,
+    TILE_CACHE_IDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class TileCache:
+    """Byte-bounded LRU of encoded tiles with an optional disk spill."""
+
+    def __init__(
+        self,
+        max_bytes: int = TILE_CACHE_BYTES,
+        disk_dir: str = TILE_CACHE_DIR,
+        disk_bytes: int = TILE_CACHE_DISK_BYTES,
+        max_ids: int = TILE_CACHE_IDS,
+        tile: int = GRID_TILE,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+        self.max_ids = max_ids
+        self.tile = tile
+        self.total_bytes = 0
+        self.disk_total = 0
+        self._tiles: "OrderedDict[str, bytes]" = OrderedDict()
+        self._ids: "OrderedDict[int, str]" = OrderedDict()
+        # key -> size of the spilled file, least recently used first
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key_for(self, source: bytes) -> str:
+        """Content key of a downloaded tile source."""
+        digest = hashlib.blake2b(source, digest_size=16).hexdigest()
+        return f"{self.tile}-{digest}"
+
+    def key_of(self, attachment_id: int) -> Optional[str]:
+        key = self._ids.get(attachment_id)
+        if key is not None:
+            self._ids.move_to_end(attachment_id)
+        return key
+
+    def link(self, attachment_id: int, key: str) -> None:
+        self._ids[attachment_id] = key
+        self._ids.move_to_end(attachment_id)
+        while len(self._ids) > self.max_ids:
+            self._ids.popitem(last=False)
+
+    # -- lookups -------------------------------------------------------------
+
+    async def get(self, key: str) -> Optional[bytes]:
+        data = self._tiles.get(key)
+        if data is not None:
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return data
+        if key in self._disk and self._executor is not None:
+            self._disk.move_to_end(key)
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(self._executor, self._read, key)
+            if data is not None:
+                self.disk_hits += 1
+                self._store(key, data)
+                return data
+            self._forget_disk(key)
+        self.misses += 1
+        return None
+
+    async def get_by_id(self, attachment_id: int) -> Optional[bytes]:
+        """The cached tile for an attachment seen before, without any download."""
+        key = self.key_of(attachment_id)
+        return await self.get(key) if key is not None else None
+
+    def put(self, key: str, data: bytes, attachment_id: Optional[int] = None) -> None:
+        if attachment_id is not None:
+            self.link(attachment_id, key)
+        if key in self._tiles:
+            self._tiles.move_to_end(key)
+        else:
+            self._store(key, data)
+
+    def _store(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        old = self._tiles.pop(key, None)
+        if old is not None:
+            self.total_bytes -= len(old)
+        self._tiles[key] = data
+        self.total_bytes += len(data)
+        while self.total_bytes > self.max_bytes:
+            evicted_key, evicted = self._tiles.popitem(last=False)
+            self.total_bytes -= len(evicted)
+            self.evictions += 1
+            self._spill(evicted_key, evicted)
+
+    # -- disk spill ------------------------------------------------------------
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.tile")
+
+    def open(self) -> None:
+        """Index tiles already spilled to disk_dir (oldest first); no-op without one."""
+        if not self.disk_dir or self._executor is not None:
+            return
+        os.makedirs(self.disk_dir, exist_ok=True)
+        # the directory is the source of truth; drop the index of a previous open
+        self._disk.clear()
+        self.disk_total = 0
+        entries: List[Tuple[float, str, int]] = []
+        with os.scandir(self.disk_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".tile") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-5], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self.disk_total += size
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="tile-cache"
+        )
+        self._trim_disk()
+        logger.info(
+            f"Tile cache spills to {self.disk_dir} "
+            f"({len(self._disk)} tile(s), {self.disk_total} bytes on disk)"
+        )
+
+    async def close(self) -> None:
+        """Spill the tiles still in memory, so content hits survive a restart."""
+        executor = self._executor
+        if executor is None:
+            return
+        for key, data in self._tiles.items():
+            self._spill(key, data)
+        self._executor = None
+        # waiting for the writes happens off the event loop
+        await asyncio.to_thread(executor.shutdown, wait=True)
+
+    def _spill(self, key: str, data: bytes) -> None:
+        if self._executor is None or key in self._disk:
+            return
+        self._disk[key] = len(data)
+        self.disk_total += len(data)
+        self._executor.submit(self._write, key, data)
+        self._trim_disk()
+
+    def _trim_disk(self) -> None:
+        while self.disk_total > self.disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self.disk_total -= size
+            if self._executor is not None:
+                self._executor.submit(self._remove, key)
+
+    def _forget_disk(self, key: str) -> None:
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self.disk_total -= size
+
+    # these run on the single tile-cache thread, in submission order
+
+    def _write(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Tile cache spill failed for {key}: {e}")
+
+    def _read(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # mtime orders the disk LRU across restarts
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def _remove(self, key: str) -> None:
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self) -> None:
+        """Drop the in-memory tiles and attachment ids (spilled tiles stay)."""
+        self._tiles.clear()
+        self._ids.clear()
+        self.total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._tiles),
+            "bytes": self.total_bytes,
+            "ids": len(self._ids),
+            "disk_entries": len(self._disk),
+            "disk_bytes": self.disk_total,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Shared by every grid in this process; the preview cog opens the disk spill
+tile_cache = TileCache()